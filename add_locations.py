@@ -1,22 +1,56 @@
-import json
-import spacy
-from typing import List, Set
+import os
+import re
+import hashlib
+import argparse
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 
-# Load spaCy model for named entity recognition
-nlp = spacy.load("en_core_web_sm")
+import json_codec
+from corpus import Corpus
 
-# Common location abbreviations and variations
+# How locations are found:
+# - 'ner': spaCy named entities plus gazetteer matches
+# - 'fast': gazetteer matches only; spaCy isn't loaded
+# - 'prefilter': like 'ner', but spaCy only sees texts with a gazetteer match
+LOCATION_MODE = 'ner'
+LOCATION_MODES = ('ner', 'fast', 'prefilter')
+
+# Batched NER settings for process_jsonl_file
+NER_BATCH_SIZE = 64  # Texts per nlp.pipe batch
+NER_PROCESSES = 1  # Worker processes for nlp.pipe; raise to use more cores
+
+# Incremental runs only tag records whose headline/article text changed since the
+# last run, per a sidecar index of content hashes and locations by URL
+INCREMENTAL = True
+INDEX_SUFFIX = '.index.json'
+INDEX_VERSION = 1  # Bump when extraction logic changes, so existing indexes are discarded
+
+_nlp = None
+
+def get_nlp():
+    """Load the spaCy model for named entity recognition on first use."""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        _nlp = spacy.load("en_core_web_sm")
+    return _nlp
+
+# Common location abbreviations and variations. Matched case-sensitively, so
+# ordinary words like "in", "or" and "me" aren't read as state codes.
 LOCATION_MAPPINGS = {
     'NYC': 'New York City',
     'NY': 'New York',
     'U.S.': 'United States',
+    'US': 'United States',
     'USA': 'United States',
+    'U.S.A.': 'United States',
     'UK': 'United Kingdom',
     'U.K.': 'United Kingdom',
     'DC': 'Washington DC',
     'D.C.': 'Washington DC',
     'SF': 'San Francisco',
     'LA': 'Los Angeles',
+    'L.A.': 'Los Angeles',
     'CA': 'California',
     'TX': 'Texas',
     'FL': 'Florida',
@@ -42,7 +76,7 @@ LOCATION_MAPPINGS = {
     'IA': 'Iowa',
     'MO': 'Missouri',
     'AR': 'Arkansas',
-    'LA': 'Louisiana',
+    'La.': 'Louisiana',  # 'LA' is Los Angeles above
     'MS': 'Mississippi',
     'AL': 'Alabama',
     'AK': 'Alaska',
@@ -65,78 +99,331 @@ LOCATION_MAPPINGS = {
     'VT': 'Vermont',
     'RI': 'Rhode Island',
     'DE': 'Delaware',
+    # AP-style abbreviations used in datelines
+    'N.Y.': 'New York',
+    'N.J.': 'New Jersey',
+    'Calif.': 'California',
+    'Wash.': 'Washington',
+    'Conn.': 'Connecticut',
+    'Mass.': 'Massachusetts',
+    'Fla.': 'Florida',
+    'Ill.': 'Illinois',
+    'Mich.': 'Michigan',
+    'Pa.': 'Pennsylvania',
+    'Ga.': 'Georgia',
+    'Va.': 'Virginia',
+    'Md.': 'Maryland',
+    'Tenn.': 'Tennessee',
+    'Ky.': 'Kentucky',
+    'Ariz.': 'Arizona',
+    'Colo.': 'Colorado',
+    'Ore.': 'Oregon',
+    'Okla.': 'Oklahoma',
+    'N.C.': 'North Carolina',
+    'S.C.': 'South Carolina',
+}
+
+# State codes that are also everyday words in capitals ("OK", "Have your ID
+# ready"). normalize_location still maps them, but the gazetteer doesn't match
+# them in running text.
+AMBIGUOUS_ABBREVIATIONS = {'OK', 'ID', 'IN', 'OR', 'ME', 'HI'}
+
+# Place names matched by the gazetteer, each with its other spellings. Matched
+# case-insensitively but only when the first word is capitalized. Cities that
+# are also common given names (Austin, Charlotte, Davis) are left to NER.
+GAZETTEER = {
+    'United States': ['United States of America', 'America'],
+    'United Kingdom': ['Britain', 'Great Britain'],
+    'New York City': [],
+    'New York': ['New York State'],
+    'Washington': ['Washington State'],
+    'Washington DC': ['Washington D.C.', 'District of Columbia'],
+    'Hubei': ['Hubei Province'],
+    'San Francisco': ['San Francisco Bay Area', 'Bay Area'],
+    'Middle East': [],
+    'Westchester County': ['Westchester'],
 }
+GAZETTEER_PLACES = [
+    # US states not already covered by the abbreviations
+    'Rhode Island', 'West Virginia',
+    # US cities and regions
+    'Seattle', 'Kirkland', 'Manhattan', 'Brooklyn', 'Queens', 'Bronx', 'New Rochelle', 'Bronxville',
+    'New Haven', 'New Orleans', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix', 'Philadelphia',
+    'San Antonio', 'San Diego', 'Dallas', 'San Jose', 'Jacksonville', 'Fort Worth', 'Atlanta',
+    'Boston', 'Detroit', 'Miami', 'Denver', 'Sacramento', 'Jonesboro', 'Northern California',
+    # International
+    'China', 'Wuhan', 'Beijing', 'Shanghai', 'Hong Kong', 'Taiwan', 'Japan', 'Tokyo', 'Yokohama',
+    'South Korea', 'Seoul', 'Daegu', 'Singapore', 'India', 'New Delhi', 'Iran', 'Tehran', 'Iraq',
+    'Israel', 'Lebanon', 'Afghanistan', 'Italy', 'Rome', 'Milan', 'Bergamo', 'Lombardy', 'Spain',
+    'Madrid', 'Valencia', 'France', 'Paris', 'Germany', 'Berlin', 'London', 'Russia', 'Moscow',
+    'Canada', 'Mexico', 'Mexico City', 'Brazil', 'Australia', 'Nairobi', 'Kenya', 'Europe',
+    'Africa', 'West Africa', 'Asia',
+    # Regions whose last word would otherwise match an alias ('America')
+    'Latin America', 'South America', 'Central America', 'North America',
+]
+
+# Words: letters with optional internal dots (U.S., D.C.) and a trailing dot (Calif.)
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+(?:\.[^\W\d_]+)*\.?")
+_MATCH = object()  # Trie key holding the canonical name of the alias ending there
+
+class GazetteerMatcher:
+    """
+    Token trie over known place aliases, mapping each to its canonical name.
+
+    Abbreviations (`abbreviations`) are stored as written and match exactly;
+    place names (`places`, canonical -> aliases) are stored lowercased, and a
+    match must start on a capitalized word. find() makes one pass over the
+    tokens, taking the longest alias at each position, so multi-word names win
+    over their parts ("New York City" over "New York"). Abbreviations in
+    `lookup_only` are resolved by lookup() but never matched by find().
+    """
+
+    def __init__(self, abbreviations: Dict[str, str], places: Dict[str, List[str]], lookup_only: Iterable[str] = ()):
+        self.root: Dict = {}
+        self.lookup_only = {a: abbreviations[a] for a in lookup_only if a in abbreviations}
+        for canonical, aliases in places.items():
+            for alias in [canonical] + list(aliases):
+                self._add([t.lower() for t in TOKEN_PATTERN.findall(alias)], canonical)
+        for abbreviation, canonical in abbreviations.items():
+            if abbreviation not in self.lookup_only:
+                self._add(TOKEN_PATTERN.findall(abbreviation), canonical)
+            # Place names from abbreviation targets ('Texas') are matchable in full too
+            self._add([t.lower() for t in TOKEN_PATTERN.findall(canonical)], canonical, overwrite=False)
+
+    def _add(self, tokens: List[str], canonical: str, overwrite: bool = True) -> None:
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if overwrite or _MATCH not in node:
+            node[_MATCH] = canonical
+
+    @staticmethod
+    def _step(node: Dict, token: str) -> Optional[Dict]:
+        # Exact first (abbreviations), then lowercased (names); a sentence-final
+        # dot may be dropped ("in Texas.")
+        lowered = token.lower()
+        for key in (token, lowered, token.rstrip('.'), lowered.rstrip('.')):
+            child = node.get(key)
+            if child is not None:
+                return child
+        return None
+
+    def find(self, text: str) -> List[str]:
+        """Canonical names of all known places in `text`, in order of appearance."""
+        tokens = TOKEN_PATTERN.findall(text or '')
+        found = []
+        i = 0
+        while i < len(tokens):
+            if not tokens[i][0].isupper():
+                i += 1
+                continue
+            node, j, match = self.root, i, None
+            while j < len(tokens):
+                node = self._step(node, tokens[j])
+                if node is None:
+                    break
+                j += 1
+                if _MATCH in node:
+                    match = (j, node[_MATCH])
+            if match:
+                i, canonical = match
+                found.append(canonical)
+            else:
+                i += 1
+        return found
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Canonical name if the whole of `name` is a known alias, else None."""
+        if name in self.lookup_only:
+            return self.lookup_only[name]
+        node = self.root
+        for token in TOKEN_PATTERN.findall(name):
+            node = self._step(node, token)
+            if node is None:
+                return None
+        return node.get(_MATCH) if node is not self.root else None
+
+gazetteer = GazetteerMatcher(LOCATION_MAPPINGS, {**GAZETTEER, **{place: [] for place in GAZETTEER_PLACES}},
+                             lookup_only=AMBIGUOUS_ABBREVIATIONS)
 
 def normalize_location(loc: str) -> str:
     """
     Normalize location names using common abbreviations and variations.
     """
-    # Convert to title case for consistency
-    loc = loc.title()
-    
-    # Check if the location is in our mappings
-    if loc in LOCATION_MAPPINGS:
-        return LOCATION_MAPPINGS[loc]
-    
-    return loc
-
-def extract_locations(text: str) -> Set[str]:
+    # Known aliases map to their canonical name
+    canonical = gazetteer.lookup(loc)
+    if canonical:
+        return canonical
+
+    # Otherwise convert to title case for consistency
+    return loc.title()
+
+def ner_disabled_components() -> List[str]:
     """
-    Extract location names from text using spaCy's named entity recognition
-    and common location patterns.
+    Pipeline components location extraction doesn't need. Only NER is kept,
+    plus tok2vec if the loaded model's NER listens to it.
     """
-    doc = nlp(text)
+    nlp = get_nlp()
+    keep = {'ner'}
+    if 'tok2vec' in nlp.pipe_names and 'ner' in getattr(nlp.get_pipe('tok2vec'), 'listening_components', []):
+        keep.add('tok2vec')
+    return [name for name in nlp.pipe_names if name not in keep]
+
+def entity_locations(doc) -> Set[str]:
+    """Collect the location entities in a processed spaCy doc."""
     locations = set()
-    
-    # Extract locations from named entities
     for ent in doc.ents:
         if ent.label_ in ['GPE', 'LOC']:  # GPE = Geo-Political Entity, LOC = Location
             locations.add(normalize_location(ent.text))
-    
-    # Look for common location patterns
-    words = text.split()
-    for i, word in enumerate(words):
-        # Check for state abbreviations
-        if word.upper() in LOCATION_MAPPINGS:
-            locations.add(LOCATION_MAPPINGS[word.upper()])
-        
-        # Check for "in [Location]" pattern
-        if word.lower() == 'in' and i + 1 < len(words):
-            next_word = words[i + 1]
-            if next_word.upper() in LOCATION_MAPPINGS:
-                locations.add(LOCATION_MAPPINGS[next_word.upper()])
-    
     return locations
 
-def process_jsonl_file(input_file: str, output_file: str):
+def extract_locations(text: str, mode: str = LOCATION_MODE) -> Set[str]:
+    """
+    Extract location names from text using spaCy's named entity recognition
+    and the gazetteer of known places (see LOCATION_MODE for `mode`).
+    """
+    locations = set(gazetteer.find(text))
+    if mode == 'fast' or (mode == 'prefilter' and not locations):
+        return locations
+    return locations | entity_locations(get_nlp()(text))
+
+def extract_locations_batch(texts: Iterable[str], batch_size: int = NER_BATCH_SIZE,
+                            n_process: int = NER_PROCESSES, mode: str = LOCATION_MODE) -> Iterator[Set[str]]:
+    """
+    Like extract_locations, for many texts at once: streams them through
+    nlp.pipe with only the components NER needs, yielding one set per text in
+    input order.
+    """
+    if mode == 'fast':
+        for text in texts:
+            yield set(gazetteer.find(text))
+        return
+
+    matches = deque()  # Gazetteer matches of texts handed to nlp.pipe, oldest first
+
+    def ner_inputs() -> Iterator[str]:
+        for text in texts:
+            found = set(gazetteer.find(text))
+            matches.append(found)
+            # Skipped texts still pass through as '' so docs stay aligned with inputs
+            yield text if (mode == 'ner' or found) else ''
+
+    docs = get_nlp().pipe(ner_inputs(), batch_size=batch_size, n_process=n_process,
+                          disable=ner_disabled_components())
+    for doc in docs:
+        yield matches.popleft() | entity_locations(doc)
+
+def content_hash(data: Dict) -> str:
+    """Hash of the fields locations are extracted from."""
+    payload = json_codec.dumps([data.get('headline', ''), data.get('article_text', '')], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def extraction_config_hash() -> str:
+    """Hash of INDEX_VERSION, the gazetteer and the location mappings."""
+    config = [INDEX_VERSION, LOCATION_MAPPINGS, sorted(AMBIGUOUS_ABBREVIATIONS), GAZETTEER, GAZETTEER_PLACES]
+    return hashlib.sha256(json_codec.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+def load_location_index(path: str, mode: str, config: str) -> Dict[str, List]:
+    """
+    Read the sidecar index ({url: [content hash, locations]}) written by the last
+    run. An index built with another mode or extraction config (see
+    extraction_config_hash) is ignored, so everything is re-tagged.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        index = json_codec.load(f)
+    if index.get('mode') != mode:
+        print(f"Location index {path} was built in '{index.get('mode')}' mode; re-tagging everything")
+        return {}
+    if index.get('config') != config:
+        print(f"Location index {path} was built with a different gazetteer or mappings; re-tagging everything")
+        return {}
+    return index.get('records', {})
+
+def process_jsonl_file(input_file: str, output_file: str, batch_size: int = NER_BATCH_SIZE,
+                       n_process: int = NER_PROCESSES, mode: str = LOCATION_MODE,
+                       incremental: bool = INCREMENTAL):
     """
     Process the JSONL file to add location information from both headlines and article text.
+
+    Headlines and article texts are tagged in batches with nlp.pipe
+    (`batch_size` texts per batch, `n_process` worker processes). Records are
+    streamed, and results come back in input order, so each location list is
+    written with the record it came from. `mode` is one of LOCATION_MODES.
+
+    With `incremental`, a sidecar index next to the output (output_file +
+    INDEX_SUFFIX) keeps each URL's content hash and locations; records whose
+    headline and article text are unchanged reuse their stored locations and
+    only new or edited ones are tagged. Without it everything is re-tagged, but
+    the index is still rewritten so the next incremental run starts from this
+    output. The output always mirrors the input (other fields come from the
+    input) and is replaced atomically.
     """
-    with open(input_file, 'r', encoding='utf-8') as f_in, \
-         open(output_file, 'w', encoding='utf-8') as f_out:
-        
-        for line in f_in:
-            try:
-                data = json.loads(line.strip())
-                
-                # Extract locations from both headline and article text
-                headline = data.get('headline', '')
-                article_text = data.get('article_text', '')
-                
-                # Combine locations from both sources
-                locations = list(extract_locations(headline) | extract_locations(article_text))
-                
-                # Add locations to the data
-                data['location'] = locations
-                
-                # Write the updated data
-                f_out.write(json.dumps(data) + '\n')
-                
-            except json.JSONDecodeError:
-                print(f"Error decoding JSON line: {line}")
+    index_file = output_file + INDEX_SUFFIX
+    config = extraction_config_hash()
+    index = load_location_index(index_file, mode, config) if incremental and os.path.exists(output_file) else {}
+    new_index = {}
+    counts = {'tagged': 0, 'reused': 0}
+    # Records read but not yet written, oldest first, with their content hash (None
+    # if they reuse stored locations). Reused records are written straight away
+    # unless tagged records ahead of them are still waiting on nlp.pipe.
+    pending = deque()
+
+    def write(f_out, data: Dict, digest: str) -> None:
+        # Write the updated data
+        f_out.write(json_codec.dumps(data) + '\n')
+        if data.get('url'):
+            new_index[data['url']] = [digest, data['location']]
+
+    def texts(records, f_out) -> Iterator[str]:
+        for data in records:
+            digest = content_hash(data)
+            stored = index.get(data.get('url'))
+            if stored and stored[0] == digest:
+                data['location'] = stored[1]
+                counts['reused'] += 1
+                if pending:
+                    pending.append((data, digest, False))
+                else:
+                    write(f_out, data, digest)
                 continue
+            pending.append((data, digest, True))
+            counts['tagged'] += 1
+            # Extract locations from both headline and article text
+            yield data.get('headline', '')
+            yield data.get('article_text', '')
+
+    tmp_file = output_file + '.tmp'
+    with Corpus(input_file) as corpus, \
+         open(tmp_file, 'w', encoding='utf-8') as f_out:
+        results = extract_locations_batch(texts(corpus.iter_records(), f_out), batch_size=batch_size, n_process=n_process, mode=mode)
+        for headline_locations in results:
+            article_locations = next(results)
+            data, digest, _ = pending.popleft()
+
+            # Combine locations from both sources
+            data['location'] = list(headline_locations | article_locations)
+            write(f_out, data, digest)
+            # Flush reused records that were queued behind this one
+            while pending and not pending[0][2]:
+                write(f_out, *pending.popleft()[:2])
+    os.replace(tmp_file, output_file)
+
+    with open(index_file + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(json_codec.dumps_compact({'mode': mode, 'config': config, 'records': new_index}))
+    os.replace(index_file + '.tmp', index_file)
+    print(f"Tagged {counts['tagged']} new or changed records, reused locations for {counts['reused']}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add extracted locations to the scraped articles")
+    parser.add_argument('--batch-size', type=int, default=NER_BATCH_SIZE, help="texts per nlp.pipe batch")
+    parser.add_argument('--processes', type=int, default=NER_PROCESSES, help="spaCy worker processes")
+    parser.add_argument('--mode', choices=LOCATION_MODES, default=LOCATION_MODE,
+                        help="ner: spaCy + gazetteer; fast: gazetteer only; prefilter: spaCy only where the gazetteer matches")
+    parser.add_argument('--full', action='store_true', help="re-tag every record instead of only new or changed ones")
+    args = parser.parse_args()
     input_file = "covid_media_serp_results.jsonl"
     output_file = "covid_media_serp_results_with_locations.jsonl"
-    process_jsonl_file(input_file, output_file) 
\ No newline at end of file
+    process_jsonl_file(input_file, output_file, batch_size=args.batch_size, n_process=args.processes, mode=args.mode,
+                       incremental=not args.full) 
\ No newline at end of file
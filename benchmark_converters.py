@@ -0,0 +1,157 @@
+"""
+Benchmark the streaming converters on a synthetic corpus.
+
+Writes N synthetic articles as JSONL, then times convert_to_json (JSONL ->
+JSON array) and json_to_csv (JSON array -> CSV), each in a fresh process so
+its peak RSS is its own. Every step runs at N and at N / 10 articles; with
+streaming I/O the two peaks should be about the same, and the run fails if
+the large one grows past --max-growth times the small one.
+
+    python benchmark_converters.py                     # 1M articles, ~9 GB of temporary files
+    python benchmark_converters.py --articles 100000 --text-chars 500
+    python benchmark_converters.py --baseline          # also time json.load/json.dump of the whole corpus
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+STEPS = ['jsonl_to_json', 'json_to_csv']
+BASELINE_STEPS = ['jsonl_to_json_in_memory', 'json_to_csv_in_memory']
+
+WORDS = ('pandemic hospital nurses patients deaths county officials vaccine masks outbreak testing '
+         'workers families community data unknown records shortage cases state federal response').split()
+TONES = ['urgent', 'neutral', 'alarmist', 'somber', 'hopeful', 'critical']
+FRAMINGS = ['public health crisis', 'economic impact', 'political conflict', 'human interest']
+
+def max_rss_mb():
+    """Peak resident memory of this process in MB, where the platform reports it."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def synthetic_articles(count, text_chars, seed=0):
+    """Articles shaped like covid_media_serp_results_with_locations.jsonl records."""
+    rng = random.Random(seed)
+    # A pool of bodies keeps generation cheap; the index makes each article distinct
+    bodies = [' '.join(rng.choice(WORDS) for _ in range(text_chars // 7)) for _ in range(256)]
+    for i in range(count):
+        yield {
+            'publish_date': f"2020-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            'source': 'The New York Times',
+            'headline': f"Article {i}: {' '.join(rng.choice(WORDS) for _ in range(8))}",
+            'url': f"https://example.com/articles/{i}",
+            'article_text': f"{i} {bodies[i % len(bodies)]}",
+            'location': rng.sample(['New York', 'California', 'Seattle', 'Texas', 'Chicago'], 2),
+            'gpt_analysis': {
+                'tone': rng.choice(TONES),
+                'framing': rng.choice(FRAMINGS),
+                'group_mentions': rng.sample(WORDS, 3),
+                'metaphors': ['war on the virus'],
+                'euphemisms': [],
+                'absences': rng.sample(WORDS, 2),
+                'grief_handling': 'minimal',
+                'blame_or_agency': 'officials',
+                'commodification_of_death': 'none',
+            },
+        }
+
+def paths(workdir, count):
+    base = os.path.join(workdir, f"articles_{count}")
+    return base + '.jsonl', base + '.json', base + '.csv'
+
+def generate(workdir, count, text_chars):
+    jsonl_path, _, _ = paths(workdir, count)
+    if not os.path.exists(jsonl_path):
+        with open(jsonl_path + '.tmp', 'w', encoding='utf-8') as f:
+            for article in synthetic_articles(count, text_chars):
+                f.write(json.dumps(article) + '\n')
+        os.replace(jsonl_path + '.tmp', jsonl_path)
+    return jsonl_path
+
+def run_step(step, workdir, count):
+    """Run one conversion in this process and print its timing as JSON."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    jsonl_path, json_path, csv_path = paths(workdir, count)
+    started = time.perf_counter()
+    if step == 'jsonl_to_json':
+        from convert_to_json import convert_jsonl_to_json
+        convert_jsonl_to_json(jsonl_path, json_path)
+    elif step == 'json_to_csv':
+        from json_to_csv import convert_json_to_csv
+        convert_json_to_csv(json_path, csv_path)
+    elif step == 'jsonl_to_json_in_memory':
+        # What convert_to_json did before streaming: build the list, then dump it
+        from convert_to_json import normalized_articles
+        articles = list(normalized_articles(jsonl_path))
+        with open(json_path + '.baseline', 'w', encoding='utf-8') as f:
+            json.dump(articles, f, indent=2, ensure_ascii=False)
+    elif step == 'json_to_csv_in_memory':
+        with open(json_path, 'r', encoding='utf-8') as f:
+            json.load(f)
+    print(json.dumps({'seconds': time.perf_counter() - started, 'max_rss_mb': max_rss_mb()}))
+
+def measure(step, workdir, count):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--step', step,
+                             '--workdir', workdir, '--articles', str(count)],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming JSONL -> JSON -> CSV converters")
+    parser.add_argument('--articles', type=int, default=1_000_000, help="synthetic articles in the large run")
+    parser.add_argument('--text-chars', type=int, default=3000, help="approximate article_text length")
+    parser.add_argument('--workdir', help="where to write the corpus (default: a temporary directory)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated files")
+    parser.add_argument('--baseline', action='store_true',
+                        help="also run the old load-everything versions (needs memory proportional to the corpus)")
+    parser.add_argument('--max-growth', type=float, default=1.5,
+                        help="fail if a step's peak RSS at --articles exceeds this multiple of its peak at 1/10th")
+    parser.add_argument('--step', choices=STEPS + BASELINE_STEPS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='dh_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    if args.step:
+        run_step(args.step, workdir, args.articles)
+        return
+
+    sizes = [max(args.articles // 10, 1), args.articles]
+    steps = STEPS + (BASELINE_STEPS if args.baseline else [])
+    results = {}
+    try:
+        for count in sizes:
+            started = time.perf_counter()
+            jsonl_path = generate(workdir, count, args.text_chars)
+            print(f"{count:>9,} articles: {os.path.getsize(jsonl_path) / 1e6:,.0f} MB of JSONL "
+                  f"generated in {time.perf_counter() - started:.1f}s")
+            for step in steps:
+                result = results[step, count] = measure(step, workdir, count)
+                print(f"  {step:<24} {result['seconds']:8.2f}s  {count / result['seconds']:>9,.0f} articles/s"
+                      f"  peak RSS {result['max_rss_mb']:7.1f} MB")
+    finally:
+        if not args.keep and not args.workdir:
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            os.rmdir(workdir)
+
+    failed = False
+    small, large = sizes
+    for step in STEPS:
+        growth = results[step, large]['max_rss_mb'] / results[step, small]['max_rss_mb']
+        ok = growth <= args.max_growth
+        failed |= not ok
+        print(f"{step}: peak RSS x{growth:.2f} from {small:,} to {large:,} articles "
+              f"({'flat' if ok else f'grows past x{args.max_growth}'})")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark json_codec against the stdlib json module on our corpus files.
+
+For each JSONL file, every line is decoded and re-encoded with both, best of
+--repeat passes, and the results are checked: decoded records must be equal,
+json_codec.dumps byte-identical to json.dumps (with and without ensure_ascii),
+and dumps_compact identical to the stdlib's compact form. The last row times
+a full Corpus pass, the read path the map and conversion scripts use.
+
+    pip install orjson   # without it json_codec is the stdlib and speedups are ~1x
+    python benchmark_json.py
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import json_codec
+from corpus import Corpus
+
+CORPUS_FILES = ['covid_media_serp_results_with_locations.jsonl', 'covid_media_serp_results.jsonl']
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def with_backend(backend, func):
+    """Run func with json_codec decoding through `backend` ('json' or 'orjson')."""
+    def run():
+        saved, json_codec.BACKEND = json_codec.BACKEND, backend
+        try:
+            return func()
+        finally:
+            json_codec.BACKEND = saved
+    return run
+
+def check(path, lines):
+    records = [json.loads(line) for line in lines]
+    for line, record in zip(lines, records):
+        assert json_codec.loads(line) == record, f"{path}: decoded records differ"
+        for ensure_ascii in (True, False):
+            assert json_codec.dumps(record, ensure_ascii=ensure_ascii) == json.dumps(record, ensure_ascii=ensure_ascii), \
+                f"{path}: dumps output differs (ensure_ascii={ensure_ascii})"
+        assert json_codec.dumps_compact(record) == json.dumps(record, ensure_ascii=False, separators=(',', ':')), \
+            f"{path}: dumps_compact output differs"
+    return records
+
+def report(name, stdlib, codec, size):
+    print(f"  {name:<22} stdlib {stdlib * 1000:8.1f} ms   json_codec {codec * 1000:8.1f} ms"
+          f"   x{stdlib / codec:4.2f}   ({size / codec / 1e6:6.1f} MB/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare json_codec with the stdlib json module on the corpus")
+    parser.add_argument('files', nargs='*', default=CORPUS_FILES, help="JSONL files to measure")
+    parser.add_argument('--repeat', type=int, default=10, help="passes per measurement (best is reported)")
+    args = parser.parse_args()
+
+    print(f"json_codec backend: {json_codec.BACKEND}")
+    for path in args.files:
+        if not os.path.exists(path):
+            print(f"{path}: not found, skipped")
+            continue
+        with open(path, 'rb') as f:
+            lines = [line for line in f.read().splitlines() if line.strip()]
+        size = sum(len(line) for line in lines)
+        records = check(path, lines)
+        print(f"{path}: {len(lines)} records, {size / 1e6:.1f} MB (outputs verified identical)")
+
+        report('decode', best_time(lambda: [json.loads(line) for line in lines], args.repeat),
+               best_time(lambda: [json_codec.loads(line) for line in lines], args.repeat), size)
+        report('encode', best_time(lambda: [json.dumps(r, ensure_ascii=False) for r in records], args.repeat),
+               best_time(lambda: [json_codec.dumps(r, ensure_ascii=False) for r in records], args.repeat), size)
+        report('encode compact',
+               best_time(lambda: [json.dumps(r, ensure_ascii=False, separators=(',', ':')) for r in records],
+                         args.repeat),
+               best_time(lambda: [json_codec.dumps_compact(r) for r in records], args.repeat), size)
+        with Corpus(path) as corpus:
+            def corpus_pass():
+                for _ in corpus.iter_records():
+                    pass
+            report('Corpus.iter_records', best_time(with_backend('json', corpus_pass), args.repeat),
+                   best_time(corpus_pass, args.repeat), size)
+    if json_codec.BACKEND == 'json':
+        print("orjson is not installed (or JSON_BACKEND=json), so both columns use the stdlib", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,43 @@
-import json
+from corpus import Corpus
+from json_stream import write_json_array
 
-def convert_jsonl_to_json(input_file, output_file):
-    # List to store all articles
-    articles = []
-    
-    # Read the JSONL file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                # Parse each line as JSON
-                article = json.loads(line.strip())
-                
-                # Ensure all required fields are present
-                required_fields = {
-                    "publish_date": "",
-                    "source": "",
-                    "headline": "",
-                    "url": "",
-                    "article_text": "",
-                    "location": [],
-                    "gpt_analysis": {
-                        "tone": "",
-                        "framing": "",
-                        "group_mentions": [],
-                        "metaphors": [],
-                        "euphemisms": [],
-                        "absences": [],
-                        "grief_handling": "",
-                        "blame_or_agency": "",
-                        "commodification_of_death": ""
-                    }
+def normalized_articles(input_file):
+    """Yield each article of the JSONL file with every required field present"""
+    # Read the JSONL file (invalid lines are skipped by the corpus reader)
+    with Corpus(input_file) as corpus:
+        for article in corpus.iter_records():
+            # Ensure all required fields are present
+            required_fields = {
+                "publish_date": "",
+                "source": "",
+                "headline": "",
+                "url": "",
+                "article_text": "",
+                "location": [],
+                "gpt_analysis": {
+                    "tone": "",
+                    "framing": "",
+                    "group_mentions": [],
+                    "metaphors": [],
+                    "euphemisms": [],
+                    "absences": [],
+                    "grief_handling": "",
+                    "blame_or_agency": "",
+                    "commodification_of_death": ""
                 }
-                
-                # Update with actual values, keeping defaults for missing fields
-                for key, value in article.items():
-                    if key in required_fields:
-                        required_fields[key] = value
-                
-                articles.append(required_fields)
-                
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON: {e}")
-                continue
-    
-    # Write to JSON file
+            }
+            
+            # Update with actual values, keeping defaults for missing fields
+            for key, value in article.items():
+                if key in required_fields:
+                    required_fields[key] = value
+            
+            yield required_fields
+
+def convert_jsonl_to_json(input_file, output_file):
+    # Write to JSON file one article at a time (same output as json.dump(..., indent=2))
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(articles, f, indent=2, ensure_ascii=False)
+        return write_json_array(f, normalized_articles(input_file), indent=2, ensure_ascii=False)
 
 if __name__ == "__main__":
     input_file = "covid_media_serp_results_with_locations.jsonl"
@@ -0,0 +1,162 @@
+import os
+import mmap
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+CORPUS_FILE = 'covid_media_serp_results_with_locations.jsonl'
+INDEX_SUFFIX = '.offsets.json'
+# Streaming hands pages already read back to the OS every this many bytes, so a
+# full pass over a large file doesn't leave all of it resident
+RELEASE_BYTES = 4 * 1024 * 1024
+
+class Corpus:
+    """
+    Read-only access to a JSONL corpus through a memory map.
+
+    A byte-offset index (one [start, end] per valid record, plus url -> record
+    number) is built on first use and persisted next to the file (path +
+    INDEX_SUFFIX); it is rebuilt whenever the file's size or mtime changes.
+    Records are parsed only when asked for, so get() and head() touch just the
+    lines they return, and iteration with `fields` keeps only those top-level
+    keys of each record, letting large values such as article_text be
+    discarded line by line instead of held for the whole corpus.
+    """
+
+    def __init__(self, path: str = CORPUS_FILE, index_path: Optional[str] = None):
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        # A zero-length file can't be mapped; treat it as an empty corpus
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._offsets: Optional[List[List[int]]] = None
+        self._urls: Optional[Dict[str, int]] = None
+
+    def _signature(self) -> List[int]:
+        stat = os.stat(self.path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _lines(self) -> Iterator[List[int]]:
+        """[start, end] of every non-blank line, without decoding anything."""
+        data, start, size = self._data, 0, len(self._data)
+        while start < size:
+            end = data.find(b'\n', start)
+            if end == -1:
+                end = size
+            if data[start:end].strip():
+                yield [start, end]
+            start = end + 1
+
+    def _load_index(self) -> None:
+        if self._offsets is not None:
+            return
+        signature = self._signature()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json_codec.load(f)
+                if index.get('signature') == signature:
+                    self._offsets, self._urls = index['offsets'], index['urls']
+                    return
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable corpus index {self.index_path}: {e}")
+        self._build_index(signature)
+
+    def _build_index(self, signature: List[int]) -> None:
+        offsets, urls = [], {}
+        for start, end in self._lines():
+            try:
+                record = json_codec.loads(self._data[start:end])
+            except json_codec.JSONDecodeError:
+                logger.warning(f"Skipping invalid JSON at byte {start} of {self.path}")
+                continue
+            if record.get('url'):
+                urls.setdefault(record['url'], len(offsets))
+            offsets.append([start, end])
+        self._offsets, self._urls = offsets, urls
+        try:
+            with open(self.index_path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(json_codec.dumps_compact({'signature': signature, 'offsets': offsets, 'urls': urls}))
+            os.replace(self.index_path + '.tmp', self.index_path)
+        except OSError as e:
+            logger.warning(f"Could not save corpus index {self.index_path}: {e}")
+        logger.info(f"Indexed {len(offsets)} records of {self.path}")
+
+    @staticmethod
+    def _project(record: Dict, fields: Optional[Iterable[str]]) -> Dict:
+        if fields is None:
+            return record
+        return {field: record[field] for field in fields if field in record}
+
+    def record(self, number: int, fields: Optional[Iterable[str]] = None) -> Dict:
+        """The `number`th record (0-based, invalid lines not counted)."""
+        self._load_index()
+        start, end = self._offsets[number]
+        return self._project(json_codec.loads(self._data[start:end]), fields)
+
+    def get(self, url: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """The first record with this URL, or None."""
+        self._load_index()
+        number = self._urls.get(url)
+        return None if number is None else self.record(number, fields)
+
+    def urls(self) -> List[str]:
+        self._load_index()
+        return list(self._urls)
+
+    def iter_records(self, fields: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+        """
+        Stream every valid record in file order. Doesn't need the offset index,
+        so a single pass over a changed file costs no more than reading it.
+        """
+        fields = list(fields) if fields is not None else None
+        released = 0
+        for start, end in self._lines():
+            if start - released >= RELEASE_BYTES:
+                released = self._release(start)
+            try:
+                record = json_codec.loads(self._data[start:end])
+            except json_codec.JSONDecodeError:
+                logger.warning(f"Skipping invalid JSON at byte {start} of {self.path}")
+                continue
+            yield self._project(record, fields)
+
+    def _release(self, upto: int) -> int:
+        """Drop the mapped pages before `upto` from memory (they are re-read if touched again)."""
+        upto -= upto % mmap.PAGESIZE
+        if upto and hasattr(mmap, 'MADV_DONTNEED') and isinstance(self._data, mmap.mmap):
+            self._data.madvise(mmap.MADV_DONTNEED, 0, upto)
+        return upto
+
+    def head(self, n: int, fields: Optional[Iterable[str]] = None) -> List[Dict]:
+        """The first `n` valid records, reading only as far as needed."""
+        records = []
+        if n <= 0:
+            return records
+        for record in self.iter_records(fields):
+            records.append(record)
+            if len(records) >= n:
+                break
+        return records
+
+    def __len__(self) -> int:
+        self._load_index()
+        return len(self._offsets)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self.iter_records()
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self) -> 'Corpus':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,15 +1,27 @@
-import os
-import json
 import time
-import requests
+_process_started = time.perf_counter()  # Startup time reported by the CLI is measured from here
+import os
+import sys
+import asyncio
+import argparse
+import hashlib
 from dotenv import load_dotenv
-from newspaper import Article
-import trafilatura
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Iterator, Optional, Set, TextIO, Tuple
+from collections import Counter
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import logging
 import random
 import re
-import spacy
+# Light, stdlib-only modules (json_codec uses orjson if installed). requests,
+# newspaper/trafilatura (extraction) and spaCy are imported on first use, so each
+# subcommand only pays for what it needs.
+import json_codec
+from page_cache import PageCache
+from near_duplicates import NUM_PERM, SHINGLE_SIZE, NearDuplicateIndex, minhash_signature
+from llm_cache import LLMCache, template_id
+from query_planner import ShardProgress, plan_shards, run_shards
+from openai_batch import BatchClient, parse_output_file, write_job_file
 
 # --- PROJECT ESSENCE ---
 """
@@ -26,10 +38,83 @@ It uses AI-driven deep media analysis to surface:
 # --- CONFIGURATION ---
 SEARCH_QUERY = 'covid deaths site:nytimes.com after:2020-03-01 before:2020-03-31'
 OUTPUT_FILE = 'covid_media_serp_results.jsonl'
+FAILURES_FILE = 'covid_media_serp_failures.jsonl'  # URLs that can never be scraped
+RESUME = True  # Skip URLs already in OUTPUT_FILE/FAILURES_FILE and append new results
 MAX_RESULTS = 1000  # Fetch up to 1000 articles
 DEBUG = True  # Toggle debug mode
-SLEEP_BETWEEN_REQUESTS = 0.2  # Lowered for speed, but not zero to avoid bans
 SERPAPI_PAGE_SIZE = 100  # SerpAPI max per page
+SEARCH_SHUFFLE_BUFFER = 200  # Max results held back and yielded in random order while paginating (capped at half a page)
+# Query planner: split a long date range and several sites into parallel shard queries
+USE_QUERY_PLANNER = False  # When False, only SEARCH_QUERY is run
+SEARCH_TERMS = 'covid deaths'
+SEARCH_SITES = ['nytimes.com']
+SEARCH_START_DATE = date(2020, 3, 1)
+SEARCH_END_DATE = date(2020, 3, 31)
+SHARD_DAYS = 7  # Days covered by each shard query
+SHARD_CONCURRENCY = 4  # Shard queries run in parallel
+SHARD_PROGRESS_FILE = 'covid_media_serp_shards.json'
+RETRY_SHARDS = []  # Shard ids (e.g. 'nytimes.com:2020-03-08') to rerun alone
+CONCURRENT_MODE = True  # Scrape and analyze several articles at once
+SCRAPE_CONCURRENCY = 8  # Max article pages being downloaded at the same time
+EXTRACT_PROCESSES = os.cpu_count() or 2  # Processes parsing article HTML (CPU-bound)
+EXTRACT_QUEUE_SIZE = 32  # Downloaded pages waiting to be parsed
+QUEUE_REPORT_SECONDS = 10  # How often the concurrent pipeline logs its queue depths
+NEAR_DUPLICATE_DETECTION = True  # Reuse the analysis of an already seen near-identical article
+NEAR_DUPLICATE_THRESHOLD = 0.8  # Min estimated Jaccard similarity of word 5-grams
+# MinHash signatures of OUTPUT_FILE's articles, kept next to it so a resumed run
+# only computes signatures for articles added since the last one
+DUPLICATE_SIGNATURES_SUFFIX = '.minhash.json'
+SIGNATURE_BATCH_SIZE = 1000  # Missing signatures computed per batch in the extract processes
+ANALYSIS_CONCURRENCY = 4  # Max GPT-4o requests in flight at the same time
+PAGE_CACHE_DIR = '.cache/pages'  # Fetched article HTML, reused across runs
+PAGE_CACHE_TTL = 30 * 24 * 3600  # Refetch pages older than 30 days
+PAGE_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # Evict least recently used pages above 1 GB
+LLM_CACHE_FILE = '.cache/llm_responses.sqlite'  # Parsed GPT analyses, reused across runs
+LLM_CACHE_PURGE_STALE = True  # Drop cached analyses made with an older prompt template
+OPENAI_MODEL = "gpt-4o"
+OPENAI_TEMPERATURE = 0.3
+# Batched analysis (concurrent mode only): pack several short articles into one GPT request
+BATCH_ANALYSIS = False
+ANALYSIS_BATCH_SIZE = 5  # Max articles per packed request
+BATCH_TOKEN_BUDGET = 6000  # Max estimated article tokens per packed request
+BATCH_MAX_ARTICLE_TOKENS = 1500  # Longer articles are always analyzed on their own
+BATCH_LINGER_SECONDS = 0.5  # How long an analyzer waits to fill a batch
+# Offline batch jobs (OpenAI Batch API) for large backfills: cheaper, not interactive
+BATCH_JOB_MODE = False  # Analyze BATCH_JOB_INPUT_FILE as one batch job instead of running the live pipeline
+BATCH_JOB_INPUT_FILE = OUTPUT_FILE  # Any JSONL with url/headline/article_text
+BATCH_JOB_DIR = '.cache/batch_jobs'  # Job input files and submission state
+BATCH_JOB_POLL_SECONDS = 60
+BATCH_COMPLETION_WINDOW = '24h'
+# Long articles: keep prompts under a token budget so latency and cost per article are bounded
+ARTICLE_TOKEN_BUDGET = 3000  # Max tokens of article text sent per request
+LONG_ARTICLE_STRATEGY = 'head'  # 'head': keep the opening plus key paragraphs; 'chunk': analyze chunks and merge
+HEAD_SHARE = 0.6  # Share of the budget given to the opening paragraphs in 'head' mode
+KEY_PARAGRAPH_PATTERN = re.compile(
+    r"\b(died|dies|death|deaths|dead|dying|toll|fatalit|victim|mourn|grie|funeral|"
+    r"nursing home|essential worker|black|latino|hispanic|native|immigrant|elderly|poor|disparit)",
+    re.IGNORECASE
+)
+SCRAPE_TIMEOUT = 30  # Seconds to wait for an article page
+USER_AGENT = 'Mozilla/5.0 (compatible; covid-media-research/1.0)'
+# Statuses that mean the page is gone for good; other download errors are retried on the next run
+PERMANENT_HTTP_STATUSES = {404, 410}
+# Per-host (initial, max) requests/second. Rates climb towards max while the host
+# keeps answering and back off on 429/5xx, honoring Retry-After.
+HOST_RATE_LIMITS = {
+    'serpapi.com': (1.0, 5.0),
+    'api.openai.com': (2.0, 20.0),
+}
+DEFAULT_HOST_RATE_LIMIT = (1.0, 5.0)  # News sites; low ceiling to avoid bans
+MAX_RETRIES = 5
+HTTP_POOL_HOSTS = 20  # Number of hosts whose keep-alive pools are kept open
+HTTP_POOL_SIZE = SCRAPE_CONCURRENCY + ANALYSIS_CONCURRENCY  # Idle connections kept per host
+HTTP_TIMEOUT = 30  # Default seconds to wait on any request
+HTTP_CONNECT_RETRIES = 2  # Retries on connection failures, below the rate limiter's retries
+# Intermediate files of the search/scrape/analyze subcommands
+SEARCH_RESULTS_FILE = 'covid_media_serp_search.jsonl'
+SCRAPED_FILE = 'covid_media_serp_scraped.jsonl'
+LOCATIONS_INPUT_FILE = 'covid_media_serp_results.jsonl'
+LOCATIONS_OUTPUT_FILE = 'covid_media_serp_results_with_locations.jsonl'
 
 # --- SETUP LOGGING ---
 logging.basicConfig(
@@ -42,81 +127,191 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 SERPAPI_API_KEY = os.getenv('SERP_API_KEY')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# Point at mock_batch_server.py (e.g. http://127.0.0.1:8089) to run without the real API
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com').rstrip('/')
 
-if not SERPAPI_API_KEY or not OPENAI_API_KEY:
-    raise ValueError("API keys not found in .env file.")
+def require_api_keys(serpapi: bool = False, openai: bool = False) -> None:
+    """Raise if a key the current command needs is missing; other commands run without them."""
+    missing = []
+    if serpapi and not SERPAPI_API_KEY:
+        missing.append('SERP_API_KEY')
+    if openai and not OPENAI_API_KEY:
+        missing.append('OPENAI_API_KEY')
+    if missing:
+        raise ValueError(f"API keys not found in .env file: {', '.join(missing)}")
+
+_rate_limiter = None
+
+def get_rate_limiter():
+    """
+    The shared rate limiter, built on first use together with its keep-alive
+    session, so repeated calls to a host skip the TCP+TLS handshake. Imports
+    requests, which commands that never touch the network don't need.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        from http_session import build_session
+        from rate_limiter import RateLimiter
+        http_session = build_session(
+            pool_connections=HTTP_POOL_HOSTS,
+            pool_maxsize=HTTP_POOL_SIZE,
+            timeout=HTTP_TIMEOUT,
+            connect_retries=HTTP_CONNECT_RETRIES,
+        )
+        _rate_limiter = RateLimiter(
+            HOST_RATE_LIMITS,
+            default_rate=DEFAULT_HOST_RATE_LIMIT,
+            max_retries=MAX_RETRIES,
+            session=http_session,
+        )
+    return _rate_limiter
 
 # --- SERPAPI SEARCH WITH PAGINATION ---
-def search_serpapi(query: str, max_results: int = 1000) -> List[Dict]:
+def fetch_serpapi_page(query: str, start: int) -> List[Dict]:
     url = 'https://serpapi.com/search'
-    articles = []
-    start = 0
-    while len(articles) < max_results:
-        params = {
-            'engine': 'google',
-            'q': query,
-            'api_key': SERPAPI_API_KEY,
-            'num': SERPAPI_PAGE_SIZE,
-            'start': start
+    params = {
+        'engine': 'google',
+        'q': query,
+        'api_key': SERPAPI_API_KEY,
+        'num': SERPAPI_PAGE_SIZE,
+        'start': start
+    }
+    logger.debug(f"Querying SerpAPI with params: {params}")
+    resp = get_rate_limiter().request('GET', url, params=params)
+    resp.raise_for_status()
+    results = resp.json()
+    organic = results.get('organic_results', [])
+    logger.debug(f"SerpAPI returned {len(organic)} results on this page.")
+    return [
+        {
+            'url': res.get('link'),
+            'headline': res.get('title'),
+            'source': res.get('source', ''),
+            'publish_date': res.get('date', '')
         }
-        logger.debug(f"Querying SerpAPI with params: {params}")
-        resp = requests.get(url, params=params)
-        resp.raise_for_status()
-        results = resp.json()
-        organic = results.get('organic_results', [])
-        logger.debug(f"SerpAPI returned {len(organic)} results on this page.")
-        for res in organic:
-            articles.append({
-                'url': res.get('link'),
-                'headline': res.get('title'),
-                'source': res.get('source', ''),
-                'publish_date': res.get('date', '')
-            })
-        if len(organic) < SERPAPI_PAGE_SIZE:
+        for res in organic
+    ]
+
+def iter_serpapi(query: str, max_results: int = 1000, shuffle_buffer: int = SEARCH_SHUFFLE_BUFFER) -> Iterator[Dict]:
+    """
+    Yield search results page by page, so downstream stages can start after the first page.
+
+    Duplicate and missing URLs are dropped as they arrive. Results pass through a
+    shuffle buffer: after each page, randomly drawn results are yielded until at
+    most `shuffle_buffer` (and no more than half a page) are held back to mix with
+    the next page. This keeps the sampling away from only the top-ranked results
+    while downstream still starts as soon as the first page has arrived.
+    """
+    keep = min(shuffle_buffer, SERPAPI_PAGE_SIZE // 2)
+    seen = set()
+    buffer = []
+    yielded = 0
+    start = 0
+    while len(seen) < max_results:
+        page = fetch_serpapi_page(query, start)
+        for art in page:
+            link = art['url']
+            if not link or link in seen or len(seen) >= max_results:
+                continue
+            seen.add(link)
+            buffer.append(art)
+        while len(buffer) > keep:
+            yield buffer.pop(random.randrange(len(buffer)))
+            yielded += 1
+        if len(page) < SERPAPI_PAGE_SIZE:
             break  # No more results
         start += SERPAPI_PAGE_SIZE
-        if len(articles) >= max_results:
-            break
-        logger.info(f"Fetched {len(articles)} articles so far...")
-        time.sleep(SLEEP_BETWEEN_REQUESTS)
+        logger.info(f"Fetched {len(seen)} articles so far...")
+    # Shuffle whatever is left in the buffer
+    random.shuffle(buffer)
+    yield from buffer
+    yielded += len(buffer)
+    logger.info(f"Total articles fetched: {yielded}")
+
+def iter_planned_search(max_results: int = 1000) -> Iterator[Dict]:
+    """
+    Run the sharded query plan (SEARCH_TERMS x SEARCH_SITES x date windows) in
+    parallel under one global result budget, yielding merged, deduplicated results.
+    Progress is kept in SHARD_PROGRESS_FILE so finished shards are skipped on rerun
+    and a failed shard can be retried alone via RETRY_SHARDS.
+    """
+    shards = plan_shards(SEARCH_TERMS, SEARCH_SITES, SEARCH_START_DATE, SEARCH_END_DATE, shard_days=SHARD_DAYS)
+    logger.info(f"Planned {len(shards)} search shards over {len(SEARCH_SITES)} sites")
+    return run_shards(
+        shards,
+        fetch_serpapi_page,
+        page_size=SERPAPI_PAGE_SIZE,
+        max_results=max_results,
+        progress=ShardProgress(SHARD_PROGRESS_FILE),
+        concurrency=SHARD_CONCURRENCY,
+        only=RETRY_SHARDS or None,
+    )
+
+def search_serpapi(query: str, max_results: int = 1000) -> List[Dict]:
+    articles = list(iter_serpapi(query, max_results=max_results))
     # Shuffle to avoid only top results
     random.shuffle(articles)
-    logger.info(f"Total articles fetched (shuffled): {len(articles)}")
-    return articles[:max_results]
+    return articles
 
 # --- ARTICLE SCRAPING ---
-def scrape_article(url: str) -> Optional[str]:
-    logger.debug(f"Attempting to scrape article with newspaper3k: {url}")
+_page_cache = None
+
+def get_page_cache() -> PageCache:
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache(PAGE_CACHE_DIR, ttl_seconds=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES)
+    return _page_cache
+
+class PageGone(Exception):
+    """The server answered with one of PERMANENT_HTTP_STATUSES."""
+
+def fetch_html(url: str) -> Optional[str]:
+    """
+    Download a page once, going through the on-disk page cache. Returns None
+    if the download failed (timeouts, DNS errors, 5xx/429 after the limiter's
+    retries) and raises PageGone if the page doesn't exist.
+    """
+    page_cache = get_page_cache()
+    html = page_cache.get(url)
+    if html is not None:
+        logger.debug(f"Page cache hit: {url}")
+        return html
+    logger.debug(f"Downloading: {url}")
     try:
-        art = Article(url)
-        art.download()
-        art.parse()
-        if art.text and len(art.text) > 200:
-            logger.debug(f"Successfully scraped with newspaper3k: {url}")
-            return art.text
-        else:
-            logger.debug(f"newspaper3k returned insufficient text for: {url}")
+        resp = get_rate_limiter().request('GET', url, headers={'User-Agent': USER_AGENT}, timeout=SCRAPE_TIMEOUT)
+        if resp.status_code in PERMANENT_HTTP_STATUSES:
+            raise PageGone(f"HTTP {resp.status_code} for {url}")
+        resp.raise_for_status()
+    except PageGone:
+        raise
     except Exception as e:
-        logger.debug(f"newspaper3k failed for {url}: {e}")
-    # Fallback to trafilatura
-    logger.debug(f"Falling back to trafilatura for: {url}")
+        logger.debug(f"Download failed for {url}: {e}")
+        return None
+    from http_session import response_text
+    html = response_text(resp)
+    if html:
+        page_cache.put(url, html)
+    return html
+
+def scrape_article(url: str) -> Tuple[Optional[str], bool]:
+    """
+    The article text, or None and whether the failure is permanent (the page is
+    gone, or it downloaded but no text could be extracted) rather than a
+    download error worth retrying on the next run.
+    """
+    from extraction import extract_article_text
     try:
-        downloaded = trafilatura.fetch_url(url)
-        if downloaded:
-            text = trafilatura.extract(downloaded)
-            if text and len(text) > 200:
-                logger.debug(f"Successfully scraped with trafilatura: {url}")
-                return text
-            else:
-                logger.debug(f"trafilatura returned insufficient text for: {url}")
-    except Exception as e:
-        logger.debug(f"trafilatura failed for {url}: {e}")
-    logger.warning(f"Failed to scrape article: {url}")
-    return None
+        html = fetch_html(url)
+    except PageGone as e:
+        logger.warning(f"Failed to scrape article: {e}")
+        return None, True
+    text = extract_article_text(url, html) if html else None
+    if not text:
+        logger.warning(f"Failed to scrape article: {url}")
+    return text, html is not None
 
 # --- GPT-4o ANALYSIS ---
-def analyze_article_with_gpt(headline: str, article_text: str) -> Optional[Dict]:
-    prompt = f"""
+ANALYSIS_INSTRUCTIONS = """
 You are an expert media analyst specializing in Digital Humanities and critical discourse analysis.
 
 You will analyze articles about COVID-19 deaths. Your goal is to extract not only the surface-level framing, but also the deeper cultural signals, silences, and omissions in the text.
@@ -144,83 +339,888 @@ Identify when grief is absent or individualized rather than collectivized.
 Treat omissions as analytically meaningful — absences matter as much as presences.
 Return only the JSON object. No extra text or explanation.
 
+"""
+ANALYSIS_PROMPT_TEMPLATE = ANALYSIS_INSTRUCTIONS + """Headline: {headline}
+Text: {article_text}
+"""
+ANALYSIS_TEMPLATE_ID = template_id(ANALYSIS_PROMPT_TEMPLATE)
+
+# The single-article instructions are reused as-is; this overrides the output format
+BATCH_ANALYSIS_PROMPT_TEMPLATE = ANALYSIS_INSTRUCTIONS + """This request contains several articles, each introduced by an "Article id" line.
+Analyze every article independently and return a JSON array with exactly one object per article.
+Each object must contain an "id" field with the article's id plus all of the fields above.
+Return only the JSON array. No extra text or explanation.
+
+{articles}
+"""
+BATCH_ARTICLE_TEMPLATE = """Article id: {id}
 Headline: {headline}
 Text: {article_text}
 """
+
+_llm_cache = None
+
+def get_llm_cache() -> LLMCache:
+    global _llm_cache
+    if _llm_cache is None:
+        os.makedirs(os.path.dirname(LLM_CACHE_FILE), exist_ok=True)
+        _llm_cache = LLMCache(LLM_CACHE_FILE)
+    return _llm_cache
+
+_token_encoder = None
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken's encoding for OPENAI_MODEL when it is installed,
+    else estimate them at ~4 characters per token.
+    """
+    global _token_encoder
+    if _token_encoder is None:
+        try:
+            import tiktoken
+            _token_encoder = tiktoken.encoding_for_model(OPENAI_MODEL)
+        except (ImportError, KeyError):
+            _token_encoder = False
+    if _token_encoder:
+        return len(_token_encoder.encode(text or '', disallowed_special=()))
+    return len(text or '') // 4 + 1
+
+def split_paragraphs(text: str) -> List[str]:
+    paragraphs = [p.strip() for p in re.split(r'\n\s*\n|\n', text or '')]
+    return [p for p in paragraphs if p]
+
+def truncate_to_budget(text: str, budget: int = ARTICLE_TOKEN_BUDGET) -> str:
+    """
+    Shrink an article to roughly `budget` tokens: keep the opening paragraphs
+    (HEAD_SHARE of the budget), then fill the rest with the later paragraphs that
+    mention deaths, grief or affected groups (KEY_PARAGRAPH_PATTERN), in their
+    original order. Dropped stretches are marked with "[...]".
+    """
+    paragraphs = split_paragraphs(text)
+    costs = [count_tokens(p) for p in paragraphs]
+    keep = set()
+    used = 0
+    for idx, cost in enumerate(costs):
+        if used + cost > budget * HEAD_SHARE:
+            break
+        keep.add(idx)
+        used += cost
+    key_paragraphs = [idx for idx, p in enumerate(paragraphs) if idx not in keep and KEY_PARAGRAPH_PATTERN.search(p)]
+    for idx in key_paragraphs:
+        if used + costs[idx] <= budget:
+            keep.add(idx)
+            used += costs[idx]
+    if not keep:
+        # A single huge paragraph: hard-cut it by characters
+        return text[:budget * 4]
+    parts = []
+    for idx in range(len(paragraphs)):
+        if idx in keep:
+            parts.append(paragraphs[idx])
+        elif not parts or parts[-1] != "[...]":
+            parts.append("[...]")
+    return "\n\n".join(parts)
+
+def chunk_to_budget(text: str, budget: int = ARTICLE_TOKEN_BUDGET) -> List[str]:
+    """Split an article on paragraph boundaries into chunks of at most ~`budget` tokens."""
+    chunks, current, used = [], [], 0
+    for paragraph in split_paragraphs(text):
+        cost = count_tokens(paragraph)
+        if current and used + cost > budget:
+            chunks.append("\n\n".join(current))
+            current, used = [], 0
+        if cost > budget:
+            # Oversized paragraph: hard-cut it into budget-sized pieces
+            step = budget * 4
+            chunks.extend(paragraph[i:i + step] for i in range(0, len(paragraph), step))
+            continue
+        current.append(paragraph)
+        used += cost
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def merge_chunk_analyses(analyses: List[Dict]) -> Dict:
+    """
+    Merge per-chunk analyses into one: list fields become the ordered union of
+    all chunks' values, other fields take the most common value (first chunk wins ties).
+    """
+    merged: Dict = {}
+    keys = []
+    for analysis in analyses:
+        keys.extend(k for k in analysis if k not in keys)
+    for key in keys:
+        values = [a[key] for a in analyses if key in a]
+        if any(isinstance(v, list) for v in values):
+            union, seen = [], set()
+            for value in values:
+                for entry in (value if isinstance(value, list) else [value]):
+                    marker = str(entry).strip().lower()
+                    if marker not in seen:
+                        seen.add(marker)
+                        union.append(entry)
+            merged[key] = union
+        else:
+            counts = Counter(json_codec.dumps(v, sort_keys=True) for v in values)
+            best = max(counts.values())
+            merged[key] = next(v for v in values if counts[json_codec.dumps(v, sort_keys=True)] == best)
+    return merged
+
+def analyze_article(headline: str, article_text: str) -> Optional[Dict]:
+    """
+    Analyze an article, keeping the text sent to GPT within ARTICLE_TOKEN_BUDGET.
+    Articles over the budget are either truncated ('head') or analyzed chunk by
+    chunk with the chunk results merged ('chunk'), per LONG_ARTICLE_STRATEGY.
+    """
+    tokens = count_tokens(article_text)
+    if tokens <= ARTICLE_TOKEN_BUDGET:
+        logger.info(f"Article tokens: {tokens} (within budget of {ARTICLE_TOKEN_BUDGET})")
+        return analyze_article_with_gpt(headline, article_text)
+    if LONG_ARTICLE_STRATEGY == 'chunk':
+        chunks = chunk_to_budget(article_text, ARTICLE_TOKEN_BUDGET)
+        logger.info(f"Article tokens: {tokens} (over budget of {ARTICLE_TOKEN_BUDGET}); analyzing {len(chunks)} chunks")
+        analyses = [analyze_article_with_gpt(headline, chunk) for chunk in chunks]
+        analyses = [a for a in analyses if a]
+        if not analyses:
+            return None
+        if len(analyses) < len(chunks):
+            logger.warning(f"{len(chunks) - len(analyses)} of {len(chunks)} chunks failed for: {str(headline)[:60]}")
+        return merge_chunk_analyses(analyses)
+    truncated = truncate_to_budget(article_text, ARTICLE_TOKEN_BUDGET)
+    logger.info(f"Article tokens: {tokens} (over budget of {ARTICLE_TOKEN_BUDGET}); truncated to {count_tokens(truncated)}")
+    return analyze_article_with_gpt(headline, truncated)
+
+def build_chat_body(prompt: str) -> Dict:
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": OPENAI_TEMPERATURE
+    }
+
+def parse_json_content(content: str):
+    logger.debug(f"GPT-4o raw response: {content[:500]}...")
+    # Remove code block markers if present
+    content = re.sub(r'^```json\s*|^```|```$', '', content.strip(), flags=re.MULTILINE)
+    content = content.strip()
+    return json_codec.loads(content)
+
+def request_chat_completion(prompt: str):
+    """
+    Send one prompt to the chat completions endpoint and return its parsed JSON
+    content. Raises on HTTP errors and on responses that are not valid JSON.
+    """
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json"
     }
-    data = {
-        "model": "gpt-4o",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.3
-    }
+    resp = get_rate_limiter().request('POST', f"{OPENAI_BASE_URL}/v1/chat/completions", headers=headers,
+                                json=build_chat_body(prompt), timeout=60)
+    resp.raise_for_status()
+    return parse_json_content(resp.json()['choices'][0]['message']['content'])
+
+def analyze_article_with_gpt(headline: str, article_text: str) -> Optional[Dict]:
+    prompt = ANALYSIS_PROMPT_TEMPLATE.format(headline=headline, article_text=article_text)
+    cached = get_llm_cache().get(prompt, OPENAI_MODEL, OPENAI_TEMPERATURE)
+    if cached is not None:
+        logger.debug(f"LLM cache hit for: {str(headline)[:60]}")
+        return cached
     try:
         logger.debug(f"Sending article to GPT-4o for analysis. Headline: {headline[:60]}")
-        resp = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=data, timeout=60)
-        resp.raise_for_status()
-        content = resp.json()['choices'][0]['message']['content']
-        logger.debug(f"GPT-4o raw response: {content[:500]}...")
-        # Remove code block markers if present
-        content = re.sub(r'^```json\s*|^```|```$', '', content.strip(), flags=re.MULTILINE)
-        content = content.strip()
-        return json.loads(content)
+        result = request_chat_completion(prompt)
+        if not isinstance(result, dict):
+            raise ValueError(f"expected a JSON object, got {type(result).__name__}")
     except Exception as e:
         logger.warning(f"GPT analysis failed: {e}")
         return None
+    get_llm_cache().put(prompt, OPENAI_MODEL, OPENAI_TEMPERATURE, result, ANALYSIS_TEMPLATE_ID)
+    return result
 
-# --- MAIN AGENT LOGIC ---
-def main():
-    logger.info(f"Querying SerpAPI: {SEARCH_QUERY}")
-    articles = search_serpapi(SEARCH_QUERY, max_results=MAX_RESULTS)
-    logger.info(f"Found {len(articles)} articles.")
+def pack_batches(items: List[Tuple[str, str]], token_budget: int = BATCH_TOKEN_BUDGET,
+                 max_articles: int = ANALYSIS_BATCH_SIZE) -> List[List[int]]:
+    """
+    Greedily group (headline, text) items into batches of indices.
+    A batch is closed when adding the next article would exceed the token budget
+    or the article limit; articles over BATCH_MAX_ARTICLE_TOKENS get their own batch.
+    """
+    batches = []
+    current, current_tokens = [], 0
+    for idx, (headline, text) in enumerate(items):
+        tokens = count_tokens(headline) + count_tokens(text)
+        if tokens > BATCH_MAX_ARTICLE_TOKENS:
+            batches.append([idx])
+            continue
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_articles):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(idx)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def analyze_articles_batched(items: List[Tuple[str, str]]) -> List[Optional[Dict]]:
+    """
+    Analyze several (headline, text) items in one GPT request and return their
+    results in the same order.
+
+    The shared instructions are sent once, followed by every article under a
+    numeric id; the model answers with a JSON array keyed by those ids. Each
+    parsed object is cached under the same key as a single-article request, so
+    batched and unbatched runs share the LLM cache. Articles that are missing
+    from the reply or fail to parse are retried on their own.
+    """
+    results: List[Optional[Dict]] = [None] * len(items)
+    prompts = [ANALYSIS_PROMPT_TEMPLATE.format(headline=h, article_text=t) for h, t in items]
+    pending = []
+    for idx, prompt in enumerate(prompts):
+        cached = get_llm_cache().get(prompt, OPENAI_MODEL, OPENAI_TEMPERATURE)
+        if cached is not None:
+            results[idx] = cached
+        else:
+            pending.append(idx)
+
+    if len(pending) > 1:
+        articles = "\n".join(
+            BATCH_ARTICLE_TEMPLATE.format(id=idx, headline=items[idx][0], article_text=items[idx][1])
+            for idx in pending
+        )
+        try:
+            logger.debug(f"Sending {len(pending)} articles to GPT-4o in one request")
+            reply = request_chat_completion(BATCH_ANALYSIS_PROMPT_TEMPLATE.format(articles=articles))
+            if not isinstance(reply, list):
+                raise ValueError(f"expected a JSON array, got {type(reply).__name__}")
+        except Exception as e:
+            logger.warning(f"Batched GPT analysis failed, retrying {len(pending)} articles one by one: {e}")
+            reply = []
+        for obj in reply:
+            if not isinstance(obj, dict):
+                continue
+            obj = dict(obj)
+            try:
+                idx = int(obj.pop('id'))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if idx in pending and results[idx] is None:
+                results[idx] = obj
+                get_llm_cache().put(prompts[idx], OPENAI_MODEL, OPENAI_TEMPERATURE, obj, ANALYSIS_TEMPLATE_ID)
+
+    for idx in pending:
+        if results[idx] is None:
+            results[idx] = analyze_article_with_gpt(*items[idx])
+    return results
+
+# --- RESULT HANDLING ---
+def build_result(art: Dict, text: str, gpt_result: Dict, duplicate_of: Optional[str] = None) -> Dict:
+    result = {
+        "publish_date": art.get("publish_date", ""),
+        "source": art.get("source", ""),
+        "headline": art.get("headline", ""),
+        "url": art['url'],
+        "article_text": text,
+        "gpt_analysis": gpt_result
+    }
+    if duplicate_of:
+        # Near-duplicate of an earlier article; its analysis was copied, not paid for again
+        result["duplicate_of"] = duplicate_of
+    return result
+
+def write_result(f: TextIO, result: Dict) -> None:
+    logger.info(f"Writing result for: {result['url']}")
+    f.write(json_codec.dumps(result, ensure_ascii=False) + "\n")
+    f.flush()
+
+def record_failure(f: TextIO, url: str, stage: str) -> None:
+    """
+    Record a permanent failure so resumed runs don't retry it. Only pages that
+    are gone (PERMANENT_HTTP_STATUSES) or yield no extractable text are
+    recorded; download errors and GPT failures are usually transient and are retried.
+    """
+    f.write(json_codec.dumps({"url": url, "stage": stage}, ensure_ascii=False) + "\n")
+    f.flush()
+
+# --- RESUME SUPPORT ---
+def load_processed_urls(path: str) -> Set[str]:
+    """
+    Read the URLs already present in a JSONL file. Missing files and
+    malformed lines (e.g. a line cut off by a crash) are ignored.
+    """
+    urls = set()
+    if not os.path.exists(path):
+        return urls
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                url = json_codec.loads(line).get('url')
+            except json_codec.JSONDecodeError:
+                continue
+            if url:
+                urls.add(url)
+    return urls
+
+def trim_partial_line(path: str) -> None:
+    """
+    Drop a trailing partial line left by an interrupted write, so appended
+    records start on a fresh line instead of being glued onto a broken one.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if not size:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # Scan backwards a block at a time for the last complete line
+        keep, pos = 0, size
+        while pos > 0:
+            start = max(0, pos - 64 * 1024)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            pos = start
+        logger.warning(f"Discarding {size - keep} bytes of partial record at the end of {path}")
+        f.truncate(keep)
+
+# --- NEAR-DUPLICATE DETECTION ---
+def text_digest(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+def load_signatures(path: str) -> Dict[str, List]:
+    """Stored {url: [text digest, signature]}, or {} if missing, unreadable or made with other MinHash settings."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            stored = json_codec.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable signature file {path}: {e}")
+        return {}
+    if stored.get('params') != [NUM_PERM, SHINGLE_SIZE]:
+        return {}
+    return stored.get('signatures', {})
+
+def load_duplicate_index(path: str, index: NearDuplicateIndex, analyses: Dict[str, Dict]) -> None:
+    """
+    Index the canonical (non-duplicate) articles already in `path` so new near
+    duplicates of them reuse their stored analysis, filling `analyses` by URL.
+
+    Signatures are read from path + DUPLICATE_SIGNATURES_SUFFIX. Articles it
+    lacks (or whose text changed) are signed in a process pool, in batches of
+    SIGNATURE_BATCH_SIZE, and the file is rewritten.
+    """
+    if not os.path.exists(path):
+        return
+    sig_path = path + DUPLICATE_SIGNATURES_SUFFIX
+    stored = load_signatures(sig_path)
+    signatures: Dict[str, List] = {}
+    missing = []  # (url, digest, text) still to sign
+    pool = None
+    computed = reused = 0
+
+    def sign_missing() -> None:
+        nonlocal pool, computed
+        if not missing:
+            return
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=EXTRACT_PROCESSES)
+        texts = [text for _, _, text in missing]
+        for (url, digest, _), sig in zip(missing, pool.map(minhash_signature, texts, chunksize=32)):
+            signatures[url] = [digest, list(sig)]
+            index.add(url, sig)
+        computed += len(missing)
+        missing.clear()
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json_codec.loads(line)
+                except json_codec.JSONDecodeError:
+                    continue
+                if record.get('duplicate_of') or not record.get('article_text') or not record.get('gpt_analysis'):
+                    continue
+                url, digest = record['url'], text_digest(record['article_text'])
+                analyses[url] = record['gpt_analysis']
+                entry = stored.get(url)
+                if entry and entry[0] == digest:
+                    signatures[url] = entry
+                    index.add(url, tuple(entry[1]))
+                    reused += 1
+                else:
+                    missing.append((url, digest, record['article_text']))
+                    if len(missing) >= SIGNATURE_BATCH_SIZE:
+                        sign_missing()
+        sign_missing()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if computed or len(signatures) != len(stored):
+        try:
+            with open(sig_path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(json_codec.dumps_compact({'params': [NUM_PERM, SHINGLE_SIZE], 'signatures': signatures}))
+            os.replace(sig_path + '.tmp', sig_path)
+        except OSError as e:
+            logger.warning(f"Could not save signatures to {sig_path}: {e}")
+    logger.info(f"Near-duplicate index loaded with {len(index)} articles from {path} "
+                f"({computed} signatures computed, {reused} reused)")
+
+# --- SEQUENTIAL PIPELINE ---
+def run_sequential_pipeline(articles: Iterable[Dict], f: TextIO, failures_f: TextIO, stats: Counter,
+                            dup_index: Optional[NearDuplicateIndex] = None,
+                            dup_analyses: Optional[Dict[str, Dict]] = None) -> None:
+    dup_analyses = {} if dup_analyses is None else dup_analyses
+    for idx, art in enumerate(articles, 1):
+        url = art['url']
+        stats['queued'] += 1
+        logger.info(f"[{idx}] Scraping: {url}")
+        text, permanent = scrape_article(url)
+        if not text:
+            logger.warning(f"Could not scrape article: {url}")
+            stats['scrape_fail'] += 1
+            if permanent:
+                record_failure(failures_f, url, 'scrape')
+            continue
+        sig = minhash_signature(text) if dup_index is not None else None
+        canonical = dup_index.query(sig) if sig else None
+        if canonical in dup_analyses:
+            logger.info(f"Near duplicate of {canonical}, reusing its analysis: {url}")
+            write_result(f, build_result(art, text, dup_analyses[canonical], duplicate_of=canonical))
+            stats['duplicates'] += 1
+            stats['success'] += 1
+            continue
+        logger.info(f"Running GPT-4o analysis for: {art['headline']}")
+        gpt_result = analyze_article(art['headline'], text)
+        if not gpt_result:
+            logger.warning(f"GPT analysis failed for: {url}")
+            stats['gpt_fail'] += 1
+            continue
+        if sig:
+            dup_index.add(url, sig)
+            dup_analyses[url] = gpt_result
+        write_result(f, build_result(art, text, gpt_result))
+        stats['success'] += 1
+
+# --- CONCURRENT PIPELINE ---
+async def run_concurrent_pipeline(articles: Iterable[Dict], f: TextIO, failures_f: TextIO, stats: Counter,
+                                  dup_index: Optional[NearDuplicateIndex] = None,
+                                  dup_analyses: Optional[Dict[str, Dict]] = None) -> None:
+    """
+    Fetch, parse and analyze articles concurrently, writing each result as soon as it is ready.
+
+    The pipeline has three stages connected by bounded queues, each with its own
+    worker pool so they scale independently:
+    - fetch: SCRAPE_CONCURRENCY threads downloading pages (network-bound)
+    - extract: EXTRACT_PROCESSES processes parsing HTML (CPU-bound, off the GIL)
+    - analysis: ANALYSIS_CONCURRENCY threads calling GPT-4o (network-bound)
+    When `dup_index` is given, each extracted text is checked against it before
+    analysis; near duplicates wait for their canonical article's analysis and
+    reuse it instead of being sent to GPT (`dup_analyses` holds known analyses).
+    `articles` may be a lazy iterator (see iter_serpapi); it is drained by a feeder
+    task, so fetching starts as soon as the first item is available. Queue depths
+    are logged every QUEUE_REPORT_SECONDS. Results are written from the event loop
+    thread only, so writes never interleave. An exception while handling one
+    article (including a broken extraction pool) is logged and counted as a
+    scrape or GPT failure for that article; workers keep draining their queues,
+    so a failing stage can't leave the others blocked on a full queue.
+    """
+    from extraction import extract_article_text
+    loop = asyncio.get_running_loop()
+    # One extra thread for the feeder pulling from the (possibly blocking) article iterator
+    executor = ThreadPoolExecutor(max_workers=SCRAPE_CONCURRENCY + ANALYSIS_CONCURRENCY + 1)
+    extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_PROCESSES)
+    fetch_queue: asyncio.Queue = asyncio.Queue(maxsize=SCRAPE_CONCURRENCY * 2)
+    extract_queue: asyncio.Queue = asyncio.Queue(maxsize=EXTRACT_QUEUE_SIZE)
+    # Bounded so earlier stages can't run arbitrarily far ahead of the (slower) analysis stage
+    per_request = ANALYSIS_BATCH_SIZE if BATCH_ANALYSIS else 1
+    analysis_queue: asyncio.Queue = asyncio.Queue(maxsize=ANALYSIS_CONCURRENCY * per_request * 2)
+    queues = {'fetch': fetch_queue, 'extract': extract_queue, 'analysis': analysis_queue}
+    max_depths = Counter()
+    article_iter = iter(articles)
+    # Canonical URL -> future resolved with its analysis (or None if it failed)
+    canonical_analyses: Dict[str, asyncio.Future] = {}
+    for url, analysis in (dup_analyses or {}).items():
+        canonical_analyses[url] = loop.create_future()
+        canonical_analyses[url].set_result(analysis)
+    duplicate_tasks = []
+
+    def scrape_failed(url: str, permanent: bool = True) -> None:
+        logger.warning(f"Could not scrape article: {url}")
+        stats['scrape_fail'] += 1
+        if permanent:
+            record_failure(failures_f, url, 'scrape')
+
+    async def report_queues():
+        while True:
+            await asyncio.sleep(QUEUE_REPORT_SECONDS)
+            depths = {name: q.qsize() for name, q in queues.items()}
+            logger.info(f"Queue depths: {depths}")
 
-    success_count = 0
-    scrape_fail_count = 0
-    gpt_fail_count = 0
+    async def feeder():
+        idx = 0
+        try:
+            while True:
+                art = await loop.run_in_executor(executor, next, article_iter, None)
+                if art is None:
+                    break
+                idx += 1
+                stats['queued'] += 1
+                await fetch_queue.put((idx, art))
+                max_depths['fetch'] = max(max_depths['fetch'], fetch_queue.qsize())
+        finally:
+            for _ in range(SCRAPE_CONCURRENCY):
+                await fetch_queue.put(None)
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        for idx, art in enumerate(articles, 1):
+    async def fetch_worker():
+        while True:
+            item = await fetch_queue.get()
+            if item is None:
+                break
+            idx, art = item
             url = art['url']
-            logger.info(f"[{idx}/{len(articles)}] Scraping: {url}")
-            text = scrape_article(url)
+            logger.info(f"[{idx}] Fetching: {url}")
+            try:
+                html = await loop.run_in_executor(executor, fetch_html, url)
+            except PageGone as e:
+                logger.debug(str(e))
+                scrape_failed(url)
+                continue
+            except Exception as e:
+                logger.error(f"Fetch crashed for {url}: {e!r}")
+                scrape_failed(url, permanent=False)
+                continue
+            if not html:
+                # Download error: not recorded, so the next run tries again
+                scrape_failed(url, permanent=False)
+                continue
+            await extract_queue.put((art, html))
+            max_depths['extract'] = max(max_depths['extract'], extract_queue.qsize())
+
+    async def extract_worker():
+        while True:
+            item = await extract_queue.get()
+            if item is None:
+                break
+            art, html = item
+            try:
+                text = await loop.run_in_executor(extract_pool, extract_article_text, art['url'], html)
+                sig = await loop.run_in_executor(extract_pool, minhash_signature, text) \
+                    if text and dup_index is not None else None
+            except Exception as e:
+                # e.g. BrokenProcessPool after a worker process died
+                logger.error(f"Extraction crashed for {art['url']}: {e!r}")
+                scrape_failed(art['url'], permanent=False)
+                continue
             if not text:
-                logger.warning(f"Could not scrape article: {url}")
-                scrape_fail_count += 1
+                scrape_failed(art['url'])
                 continue
+            if dup_index is not None:
+                canonical = dup_index.find_or_add(art['url'], sig)
+                if canonical in canonical_analyses:
+                    duplicate_tasks.append(asyncio.create_task(handle_duplicate(art, text, canonical)))
+                    continue
+                canonical_analyses[art['url']] = loop.create_future()
+            await analysis_queue.put((art, text))
+            max_depths['analysis'] = max(max_depths['analysis'], analysis_queue.qsize())
+
+    async def handle_duplicate(art: Dict, text: str, canonical: str):
+        gpt_result = await canonical_analyses[canonical]
+        if gpt_result:
+            logger.info(f"Near duplicate of {canonical}, reusing its analysis: {art['url']}")
+            stats['duplicates'] += 1
+            finish_analysis(art, text, gpt_result, duplicate_of=canonical)
+            return
+        # The canonical article's analysis failed, so analyze this copy itself
+        finish_analysis(art, text, await analyze_safely(analyze_article, art['headline'], text))
+
+    async def analyze_safely(func, *args):
+        """Run an analysis call in the thread pool; an exception counts as a failed analysis."""
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except Exception as e:
+            logger.error(f"GPT analysis crashed: {e!r}")
+            return None
+
+    def finish_analysis(art: Dict, text: str, gpt_result: Optional[Dict], duplicate_of: Optional[str] = None) -> None:
+        future = canonical_analyses.get(art['url'])
+        if future is not None and not future.done():
+            future.set_result(gpt_result)
+        if not gpt_result:
+            logger.warning(f"GPT analysis failed for: {art['url']}")
+            stats['gpt_fail'] += 1
+            return
+        write_result(f, build_result(art, text, gpt_result, duplicate_of=duplicate_of))
+        stats['success'] += 1
+
+    async def batch_analysis_worker():
+        finished = False
+        while not finished:
+            item = await analysis_queue.get()
+            if item is None:
+                break
+            # Gather whatever else arrives shortly, then pack it into token-bounded requests
+            batch = [item]
+            deadline = loop.time() + BATCH_LINGER_SECONDS
+            while len(batch) < ANALYSIS_BATCH_SIZE * 2:
+                try:
+                    nxt = await asyncio.wait_for(analysis_queue.get(), timeout=max(0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if nxt is None:
+                    finished = True
+                    break
+                batch.append(nxt)
+            items = [(art['headline'], text) for art, text in batch]
+            for indices in pack_batches(items):
+                if len(indices) == 1:
+                    # Single (possibly long) article: goes through the token budget handling
+                    logger.info(f"Running GPT-4o analysis for: {items[indices[0]][0]}")
+                    gpt_results = [await analyze_safely(analyze_article, *items[indices[0]])]
+                else:
+                    logger.info(f"Running GPT-4o analysis for {len(indices)} articles in one request")
+                    gpt_results = await analyze_safely(analyze_articles_batched, [items[i] for i in indices]) \
+                        or [None] * len(indices)
+                for i, gpt_result in zip(indices, gpt_results):
+                    art, text = batch[i]
+                    finish_analysis(art, text, gpt_result)
+
+    async def analysis_worker():
+        while True:
+            item = await analysis_queue.get()
+            if item is None:
+                break
+            art, text = item
             logger.info(f"Running GPT-4o analysis for: {art['headline']}")
-            gpt_result = analyze_article_with_gpt(art['headline'], text)
-            if not gpt_result:
-                logger.warning(f"GPT analysis failed for: {url}")
-                gpt_fail_count += 1
+            gpt_result = await analyze_safely(analyze_article, art['headline'], text)
+            finish_analysis(art, text, gpt_result)
+
+    reporter = asyncio.create_task(report_queues())
+    try:
+        fetchers = [asyncio.create_task(fetch_worker()) for _ in range(SCRAPE_CONCURRENCY)]
+        extractors = [asyncio.create_task(extract_worker()) for _ in range(EXTRACT_PROCESSES)]
+        worker = batch_analysis_worker if BATCH_ANALYSIS else analysis_worker
+        analyzers = [asyncio.create_task(worker()) for _ in range(ANALYSIS_CONCURRENCY)]
+        await asyncio.gather(feeder(), *fetchers)
+        for _ in extractors:
+            await extract_queue.put(None)
+        await asyncio.gather(*extractors)
+        for _ in analyzers:
+            await analysis_queue.put(None)
+        await asyncio.gather(*analyzers)
+        # Every canonical analysis is settled now, so waiting duplicates can finish
+        await asyncio.gather(*duplicate_tasks)
+    finally:
+        reporter.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+        extract_pool.shutdown(wait=False, cancel_futures=True)
+    logger.info(f"Peak queue depths: {dict(max_depths)}")
+
+# --- OFFLINE BATCH JOBS ---
+def merge_analyses(output_file: str, records: Dict[str, Dict], analyses: Dict[str, Dict]) -> None:
+    """
+    Merge analyses into output_file by URL: existing records get their gpt_analysis
+    replaced in place, new URLs are appended. The file is rewritten atomically.
+    """
+    merged: Dict[str, Dict] = {}
+    if os.path.exists(output_file):
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json_codec.loads(line)
+                except json_codec.JSONDecodeError:
+                    continue
+                merged[record.get('url')] = record
+    for url, analysis in analyses.items():
+        if url in merged:
+            merged[url]['gpt_analysis'] = analysis
+        else:
+            merged[url] = build_result(records[url], records[url]['article_text'], analysis)
+    tmp_path = output_file + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for record in merged.values():
+            f.write(json_codec.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, output_file)
+
+def run_batch_job(input_file: str, output_file: str) -> None:
+    """
+    Analyze every article in input_file through the OpenAI Batch API and merge
+    the results into output_file by URL.
+
+    Articles that already have a gpt_analysis (or copy one as a near duplicate)
+    and prompts already in the LLM cache are not resubmitted. The job file and
+    the submitted batch id are kept in BATCH_JOB_DIR, so rerunning with the same
+    pending articles resumes polling the existing batch instead of paying again;
+    a saved batch the API no longer knows (4xx) is dropped and submitted afresh.
+    Long articles are truncated to ARTICLE_TOKEN_BUDGET ('chunk' is not used here).
+    """
+    import requests
+
+    records: Dict[str, Dict] = {}
+    analyzed = 0
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json_codec.loads(line)
+            except json_codec.JSONDecodeError:
+                continue
+            if not (record.get('url') and record.get('article_text')):
                 continue
-            result = {
-                "publish_date": art.get("publish_date", ""),
-                "source": art.get("source", ""),
-                "headline": art.get("headline", ""),
-                "url": url,
-                "article_text": text,
-                "gpt_analysis": gpt_result
-            }
-            logger.info(f"Writing result for: {url}")
-            f.write(json.dumps(result, ensure_ascii=False) + "\n")
-            f.flush()
-            success_count += 1
-            logger.debug(f"Sleeping for {SLEEP_BETWEEN_REQUESTS} seconds to avoid rate limits.")
-            time.sleep(SLEEP_BETWEEN_REQUESTS)
+            if record.get('gpt_analysis') or record.get('duplicate_of'):
+                analyzed += 1
+                continue
+            records[record['url']] = record
+    logger.info(f"Batch job: {len(records)} articles to analyze in {input_file} ({analyzed} already analyzed)")
+
+    analyses: Dict[str, Dict] = {}
+    prompts: Dict[str, str] = {}
+    for url, record in records.items():
+        text = record['article_text']
+        if count_tokens(text) > ARTICLE_TOKEN_BUDGET:
+            text = truncate_to_budget(text, ARTICLE_TOKEN_BUDGET)
+        prompt = ANALYSIS_PROMPT_TEMPLATE.format(headline=record.get('headline', ''), article_text=text)
+        cached = get_llm_cache().get(prompt, OPENAI_MODEL, OPENAI_TEMPERATURE)
+        if cached is not None:
+            analyses[url] = cached
+        else:
+            prompts[url] = prompt
+    logger.info(f"Batch job: {len(analyses)} cached, {len(prompts)} to submit")
+
+    failed = 0
+    if prompts:
+        ids = {hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]: url for url in prompts}
+        job_key = hashlib.sha1((ANALYSIS_TEMPLATE_ID + ''.join(sorted(ids))).encode('utf-8')).hexdigest()[:12]
+        os.makedirs(BATCH_JOB_DIR, exist_ok=True)
+        job_file = os.path.join(BATCH_JOB_DIR, f"job_{job_key}.jsonl")
+        state_file = os.path.join(BATCH_JOB_DIR, f"job_{job_key}.state.json")
+        client = BatchClient(OPENAI_BASE_URL, OPENAI_API_KEY, get_rate_limiter().request)
+
+        def submit() -> str:
+            count = write_job_file(job_file, ((cid, build_chat_body(prompts[url])) for cid, url in ids.items()))
+            file_id = client.upload(job_file)
+            batch_id = client.create(file_id, completion_window=BATCH_COMPLETION_WINDOW)['id']
+            with open(state_file, 'w', encoding='utf-8') as f:
+                f.write(json_codec.dumps({"batch_id": batch_id, "input_file_id": file_id, "requests": count}))
+            logger.info(f"Submitted batch {batch_id} with {count} requests")
+            return batch_id
+
+        batch = None
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, 'r', encoding='utf-8') as f:
+                    batch_id = json_codec.load(f)['batch_id']
+                logger.info(f"Resuming existing batch {batch_id}")
+                batch = client.wait(batch_id, poll_seconds=BATCH_JOB_POLL_SECONDS)
+            except (ValueError, KeyError) as e:
+                logger.error(f"Unreadable batch state {state_file} ({e}); submitting a new batch")
+            except requests.HTTPError as e:
+                if e.response is None or not 400 <= e.response.status_code < 500:
+                    raise
+                logger.error(f"Saved batch {batch_id} can't be fetched ({e}); submitting a new batch")
+            if batch is None:
+                os.remove(state_file)
+        if batch is None:
+            batch_id = submit()
+            batch = client.wait(batch_id, poll_seconds=BATCH_JOB_POLL_SECONDS)
+        if batch.get('status') != 'completed' or not batch.get('output_file_id'):
+            # Drop the state so the next run submits a fresh batch
+            os.remove(state_file)
+            logger.error(f"Batch {batch_id} ended as {batch.get('status')}; nothing merged from it")
+            failed = len(prompts)
+        else:
+            contents = parse_output_file(client.download(batch['output_file_id']))
+            for cid, url in ids.items():
+                content = contents.get(cid)
+                try:
+                    analysis = parse_json_content(content) if content else None
+                except json_codec.JSONDecodeError as e:
+                    logger.warning(f"Could not parse batch result for {url}: {e}")
+                    analysis = None
+                if not isinstance(analysis, dict):
+                    failed += 1
+                    continue
+                analyses[url] = analysis
+                get_llm_cache().put(prompts[url], OPENAI_MODEL, OPENAI_TEMPERATURE, analysis, ANALYSIS_TEMPLATE_ID)
+
+    merge_analyses(output_file, records, analyses)
+    logger.info(f"Batch job done: {len(analyses)} analyses merged into {output_file}, {failed} failed")
+
+# --- MAIN AGENT LOGIC ---
+def skip_processed(articles: Iterable[Dict], done: Set[str], stats: Counter) -> Iterator[Dict]:
+    for art in articles:
+        if art['url'] in done:
+            stats['skipped'] += 1
+            continue
+        yield art
+
+def log_client_stats() -> None:
+    """Log the cache, rate limiter and connection stats of whatever this run used."""
+    if _page_cache is not None:
+        logger.info(f"Page cache: {_page_cache.summary()}")
+    if _llm_cache is not None:
+        logger.info(f"LLM cache: {_llm_cache.summary()}")
+    if _rate_limiter is not None:
+        logger.info(f"Rate limiter: {_rate_limiter.summary()}")
+        logger.info(f"HTTP connection reuse per host: {_rate_limiter.session.connection_stats.summary()}")
+
+def main():
+    require_api_keys(serpapi=True, openai=True)
+    # Streamed: scraping starts while later SerpAPI pages are still being fetched
+    if USE_QUERY_PLANNER:
+        articles = iter_planned_search(max_results=MAX_RESULTS)
+    else:
+        logger.info(f"Querying SerpAPI: {SEARCH_QUERY}")
+        articles = iter_serpapi(SEARCH_QUERY, max_results=MAX_RESULTS)
+
+    stats = Counter()
+
+    if LLM_CACHE_PURGE_STALE:
+        get_llm_cache().invalidate_stale(ANALYSIS_TEMPLATE_ID)
+
+    if RESUME:
+        # Pick up where an interrupted run stopped instead of redoing paid work
+        trim_partial_line(OUTPUT_FILE)
+        trim_partial_line(FAILURES_FILE)
+        done = load_processed_urls(OUTPUT_FILE) | load_processed_urls(FAILURES_FILE)
+        logger.info(f"Resuming: {len(done)} articles already processed will be skipped.")
+        articles = skip_processed(articles, done, stats)
+    mode = "a" if RESUME else "w"
+
+    dup_index, dup_analyses = None, {}
+    if NEAR_DUPLICATE_DETECTION:
+        dup_index = NearDuplicateIndex(threshold=NEAR_DUPLICATE_THRESHOLD)
+        if RESUME:
+            load_duplicate_index(OUTPUT_FILE, dup_index, dup_analyses)
+
+    with open(OUTPUT_FILE, mode, encoding="utf-8") as f, \
+         open(FAILURES_FILE, mode, encoding="utf-8") as failures_f:
+        if CONCURRENT_MODE:
+            logger.info(f"Running concurrent pipeline ({SCRAPE_CONCURRENCY} fetchers, {EXTRACT_PROCESSES} extractors, {ANALYSIS_CONCURRENCY} analyzers)")
+            asyncio.run(run_concurrent_pipeline(articles, f, failures_f, stats, dup_index, dup_analyses))
+        else:
+            run_sequential_pipeline(articles, f, failures_f, stats, dup_index, dup_analyses)
 
     logger.info(f"Done! Results saved to {OUTPUT_FILE}")
-    logger.info(f"Summary: {success_count} successful, {scrape_fail_count} scrape failures, {gpt_fail_count} GPT failures out of {len(articles)} articles.")
+    log_client_stats()
+    logger.info(f"Summary: {stats['success']} successful, {stats['scrape_fail']} scrape failures, {stats['gpt_fail']} GPT failures out of {stats['queued']} articles ({stats['duplicates']} near duplicates reused an earlier analysis, {stats['skipped']} skipped as already processed).")
 
-# Load spaCy model for named entity recognition
-nlp = spacy.load("en_core_web_sm")
+# --- LOCATIONS ---
+_nlp = None
+
+def get_nlp():
+    """Load the spaCy model for named entity recognition on first use."""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        _nlp = spacy.load("en_core_web_sm")
+    return _nlp
 
 def extract_locations(text: str) -> List[str]:
     """
     Extract location names from text using spaCy's named entity recognition.
     """
-    doc = nlp(text)
+    doc = get_nlp()(text)
     locations = []
     for ent in doc.ents:
         if ent.label_ in ['GPE', 'LOC']:  # GPE = Geo-Political Entity, LOC = Location
@@ -236,7 +1236,7 @@ def process_jsonl_file(input_file: str, output_file: str):
         
         for line in f_in:
             try:
-                data = json.loads(line.strip())
+                data = json_codec.loads(line.strip())
                 
                 # Extract locations from headline
                 headline = data.get('headline', '')
@@ -246,14 +1246,144 @@ def process_jsonl_file(input_file: str, output_file: str):
                 data['locations'] = locations
                 
                 # Write the updated data
-                f_out.write(json.dumps(data) + '\n')
+                f_out.write(json_codec.dumps(data) + '\n')
                 
-            except json.JSONDecodeError:
+            except json_codec.JSONDecodeError:
                 print(f"Error decoding JSON line: {line}")
                 continue
 
+# --- COMMAND LINE ---
+def read_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json_codec.loads(line)
+            except json_codec.JSONDecodeError:
+                continue
+
+def max_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in MB, where the platform reports it."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def report_resources(command: str, stage: str, since: float) -> None:
+    rss = max_rss_mb()
+    memory = f", peak RSS {rss:.1f} MB" if rss is not None else ""
+    logger.info(f"{command}: {stage} after {time.perf_counter() - since:.2f}s{memory}")
+
+def cmd_search(args) -> None:
+    """Run the SerpAPI search (or the shard planner) and save the hits as JSONL."""
+    require_api_keys(serpapi=True)
+    if USE_QUERY_PLANNER:
+        articles = iter_planned_search(max_results=args.max_results)
+    else:
+        logger.info(f"Querying SerpAPI: {SEARCH_QUERY}")
+        articles = iter_serpapi(SEARCH_QUERY, max_results=args.max_results)
+    count = 0
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for art in articles:
+            f.write(json_codec.dumps(art, ensure_ascii=False) + "\n")
+            count += 1
+    logger.info(f"Saved {count} search results to {args.output}")
+
+def cmd_scrape(args) -> None:
+    """Download and extract the articles listed in a search results file."""
+    arts = list(read_jsonl(args.input))
+    stats = Counter()
+    with open(args.output, 'w', encoding='utf-8') as f, \
+         ThreadPoolExecutor(max_workers=SCRAPE_CONCURRENCY) as executor:
+        for art, text in zip(arts, executor.map(lambda art: scrape_article(art['url'])[0], arts)):
+            if not text:
+                stats['scrape_fail'] += 1
+                continue
+            f.write(json_codec.dumps(dict(art, article_text=text), ensure_ascii=False) + "\n")
+            stats['success'] += 1
+    log_client_stats()
+    logger.info(f"Scraped {stats['success']} of {len(arts)} articles into {args.output} ({stats['scrape_fail']} failed)")
+
+def cmd_analyze(args) -> None:
+    """
+    Analyze scraped articles with GPT-4o, live or as an offline batch job.
+    Live runs append to the output and skip URLs it already holds.
+    """
+    require_api_keys(openai=True)
+    if args.batch_job:
+        run_batch_job(args.input, args.output)
+        log_client_stats()
+        return
+    if LLM_CACHE_PURGE_STALE:
+        get_llm_cache().invalidate_stale(ANALYSIS_TEMPLATE_ID)
+    trim_partial_line(args.output)
+    done = load_processed_urls(args.output)
+    records, stats = [], Counter()
+    for r in read_jsonl(args.input):
+        if not (r.get('url') and r.get('article_text')):
+            continue
+        if r['url'] in done:
+            stats['skipped'] += 1
+            continue
+        done.add(r['url'])
+        records.append(r)
+    if stats['skipped']:
+        logger.info(f"Skipping {stats['skipped']} articles already in {args.output}")
+    with open(args.output, 'a', encoding='utf-8') as f, \
+         ThreadPoolExecutor(max_workers=ANALYSIS_CONCURRENCY) as executor:
+        results = executor.map(lambda r: analyze_article(r.get('headline', ''), r['article_text']), records)
+        for record, gpt_result in zip(records, results):
+            if not gpt_result:
+                logger.warning(f"GPT analysis failed for: {record['url']}")
+                stats['gpt_fail'] += 1
+                continue
+            write_result(f, build_result(record, record['article_text'], gpt_result))
+            stats['success'] += 1
+    log_client_stats()
+    logger.info(f"Analyzed {stats['success']} of {len(records)} articles into {args.output} ({stats['gpt_fail']} failed)")
+
+def cmd_locations(args) -> None:
+    """Add spaCy location entities from headlines to a results file."""
+    process_jsonl_file(args.input, args.output)
+
+def cmd_run(args) -> None:
+    """The full collection run: search, scrape and analyze, then add locations."""
+    if BATCH_JOB_MODE:
+        run_batch_job(BATCH_JOB_INPUT_FILE, OUTPUT_FILE)
+    else:
+        main()
+    process_jsonl_file(LOCATIONS_INPUT_FILE, LOCATIONS_OUTPUT_FILE)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Collect and analyze news coverage of COVID-19 deaths. "
+                                                 "Without a command, runs the whole pipeline.")
+    commands = parser.add_subparsers(dest='command')
+    search = commands.add_parser('search', help="fetch search results only")
+    search.add_argument('--output', default=SEARCH_RESULTS_FILE)
+    search.add_argument('--max-results', type=int, default=MAX_RESULTS)
+    search.set_defaults(func=cmd_search)
+    scrape = commands.add_parser('scrape', help="download and extract articles from search results")
+    scrape.add_argument('--input', default=SEARCH_RESULTS_FILE)
+    scrape.add_argument('--output', default=SCRAPED_FILE)
+    scrape.set_defaults(func=cmd_scrape)
+    analyze = commands.add_parser('analyze', help="run GPT-4o analysis on scraped articles")
+    analyze.add_argument('--input', default=SCRAPED_FILE)
+    analyze.add_argument('--output', default=OUTPUT_FILE, help="appended to (merged into with --batch-job)")
+    analyze.add_argument('--batch-job', action='store_true', help="submit one offline Batch API job instead")
+    analyze.set_defaults(func=cmd_analyze)
+    locations = commands.add_parser('locations', help="add location entities to analyzed results")
+    locations.add_argument('--input', default=LOCATIONS_INPUT_FILE)
+    locations.add_argument('--output', default=LOCATIONS_OUTPUT_FILE)
+    locations.set_defaults(func=cmd_locations)
+    parser.set_defaults(func=cmd_run, command='run')
+    return parser
+
 if __name__ == "__main__":
-    main()
-    input_file = "covid_media_serp_results.jsonl"
-    output_file = "covid_media_serp_results_with_locations.jsonl"
-    process_jsonl_file(input_file, output_file)
\ No newline at end of file
+    args = build_parser().parse_args()
+    # Startup: interpreter + this module's imports + argument parsing. Heavy
+    # dependencies load later, when the command first needs them.
+    report_resources(args.command, "ready", _process_started)
+    args.func(args)
+    report_resources(args.command, "finished", _process_started)
@@ -1,8 +1,13 @@
+import os
 import pandas as pd
 from wordcloud import WordCloud
 import matplotlib.pyplot as plt
 import numpy as np
 
+from json_to_parquet import LIST_COLUMNS, pa
+
+PARQUET_FILE = 'dh.parquet'  # Written by json_to_parquet.py; read instead of dh.csv when present
+
 categories = [
     'tone', 'framing', 'group_mentions', 'metaphors', 
     'euphemisms', 'absences', 'grief_handling', 
@@ -35,14 +40,24 @@ def create_wordcloud(text, ax, prefer_horizontal):
     ax.imshow(wordcloud, interpolation='bilinear')
     ax.axis('off')
 
-def main():
+def load_category_text():
+    """
+    All text per category. From dh.parquet only the category columns are
+    read, and list columns are flattened as lists; dh.csv is the fallback.
+    """
+    if pa is not None and os.path.exists(PARQUET_FILE):
+        df = pd.read_parquet(PARQUET_FILE, columns=categories)
+        return {
+            category: (df[category].explode() if category in LIST_COLUMNS else df[category])
+                      .dropna().astype(str).str.cat(sep=' ')
+            for category in categories
+        }
     df = pd.read_csv('dh.csv')
+    return {category: df[category].dropna().astype(str).str.cat(sep=' ') for category in categories}
 
+def main():
     # Aggregate text per category
-    sample_data = {}
-    for category in categories:
-        all_text = df[category].dropna().astype(str).str.cat(sep=' ')
-        sample_data[category] = all_text
+    sample_data = load_category_text()
     
     # Grid layout
     n_categories = len(categories)
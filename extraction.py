@@ -0,0 +1,41 @@
+import logging
+from typing import Optional
+
+from newspaper import Article
+import trafilatura
+
+logger = logging.getLogger(__name__)
+
+MIN_ARTICLE_CHARS = 200  # Shorter extractions are treated as failures
+
+def extract_article_text(url: str, html: str) -> Optional[str]:
+    """
+    Extract the article body from downloaded HTML: newspaper3k first, trafilatura
+    as a fallback. CPU-bound and free of network I/O, so the agent can run it in
+    a process pool; kept in its own light module so worker processes don't import
+    the whole agent.
+    """
+    logger.debug(f"Attempting to extract article with newspaper3k: {url}")
+    try:
+        art = Article(url)
+        art.download(input_html=html)
+        art.parse()
+        if art.text and len(art.text) > MIN_ARTICLE_CHARS:
+            logger.debug(f"Successfully scraped with newspaper3k: {url}")
+            return art.text
+        else:
+            logger.debug(f"newspaper3k returned insufficient text for: {url}")
+    except Exception as e:
+        logger.debug(f"newspaper3k failed for {url}: {e}")
+    # Fallback to trafilatura on the same downloaded page
+    logger.debug(f"Falling back to trafilatura for: {url}")
+    try:
+        text = trafilatura.extract(html)
+        if text and len(text) > MIN_ARTICLE_CHARS:
+            logger.debug(f"Successfully scraped with trafilatura: {url}")
+            return text
+        else:
+            logger.debug(f"trafilatura returned insufficient text for: {url}")
+    except Exception as e:
+        logger.debug(f"trafilatura failed for {url}: {e}")
+    return None
@@ -0,0 +1,184 @@
+import os
+import re
+import sys
+import logging
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Gazetteer files in GeoNames dump format (tab-separated, 19 columns; see
+# https://download.geonames.org/export/dump/readme.txt). geonames_places.txt is a
+# small bundled seed covering the places in our corpus; drop a full dump such as
+# cities15000.txt or allCountries.txt next to it for worldwide coverage.
+GAZETTEER_FILES = ['geonames_places.txt', 'cities15000.txt']
+
+# Tie-breaks between places of equal population: countries, then first-level
+# admin areas (US states), then cities, then regions and continents
+FEATURE_RANK = {'A': 3, 'P': 2, 'L': 1}
+
+class Place(NamedTuple):
+    name: str
+    lat: float
+    lon: float
+    country: str
+    admin1: str
+    feature_class: str
+    feature_code: str
+    population: int
+
+def normalize_name(name: str) -> str:
+    """
+    Lookup key for a place name: accents, case, punctuation, a leading "the" and
+    a trailing possessive are ignored, so "The United States", "U.S." and
+    "New York City’s" find the same entries as their plain spellings.
+    """
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(ch for ch in name if not unicodedata.combining(ch)).lower()
+    name = re.sub(r"['’]s\b", '', name)
+    name = re.sub(r'[.\']', '', name)
+    name = re.sub(r'[^\w]+', ' ', name).strip()
+    return re.sub(r'^the ', '', name)
+
+class Geocoder:
+    """
+    Offline geocoder over one or more GeoNames-format gazetteer files.
+
+    Rows are kept in parallel arrays (coordinates and populations in typed
+    arrays, codes as interned strings), with a dict from normalized name to row
+    numbers. Primary names are tried before alternate names; among the matches
+    that pass the country/admin1/feature-class filters, the most populous wins.
+    Lookups are memoized, and names that match nothing are counted for
+    miss_report().
+    """
+
+    def __init__(self, paths: Iterable[str] = GAZETTEER_FILES):
+        self.names: List[str] = []
+        self.lat = array('d')
+        self.lon = array('d')
+        self.population = array('q')
+        self.country: List[str] = []
+        self.admin1: List[str] = []
+        self.feature_class: List[str] = []
+        self.feature_code: List[str] = []
+        # Normalized name -> row number, or a list of row numbers when several places share it
+        self._primary: Dict[str, object] = {}
+        self._alternate: Dict[str, object] = {}
+        self._memo: Dict[Tuple, Optional[int]] = {}
+        self.misses: Counter = Counter()
+        self.stats = {'lookups': 0, 'memo_hits': 0, 'misses': 0}
+        for path in paths:
+            if os.path.exists(path):
+                self.load(path)
+            else:
+                logger.debug(f"Gazetteer file not found, skipping: {path}")
+
+    @staticmethod
+    def _index(index: Dict[str, object], key: str, row: int) -> None:
+        current = index.get(key)
+        if current is None:
+            index[key] = row
+        elif isinstance(current, list):
+            if row not in current:
+                current.append(row)
+        elif current != row:
+            index[key] = [current, row]
+
+    def load(self, path: str) -> int:
+        """Add the rows of a GeoNames-format file. Returns the number of rows loaded."""
+        count = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip() or line.startswith('#'):
+                    continue
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 15:
+                    continue
+                try:
+                    lat, lon = float(fields[4]), float(fields[5])
+                except ValueError:
+                    continue
+                row = len(self.names)
+                self.names.append(fields[1])
+                self.lat.append(lat)
+                self.lon.append(lon)
+                self.population.append(int(fields[14] or 0))
+                # Codes repeat across millions of rows; share one string object each
+                self.country.append(sys.intern(fields[8]))
+                self.admin1.append(sys.intern(fields[10]))
+                self.feature_class.append(sys.intern(fields[6]))
+                self.feature_code.append(sys.intern(fields[7]))
+                for name in (fields[1], fields[2]):
+                    key = normalize_name(name)
+                    if key:
+                        self._index(self._primary, key, row)
+                for name in fields[3].split(','):
+                    key = normalize_name(name)
+                    if key:
+                        self._index(self._alternate, key, row)
+                count += 1
+        self._memo.clear()
+        logger.info(f"Gazetteer {path}: {count} places loaded")
+        return count
+
+    def _candidates(self, index: Dict[str, object], key: str) -> List[int]:
+        rows = index.get(key)
+        if rows is None:
+            return []
+        return rows if isinstance(rows, list) else [rows]
+
+    def _matches(self, row: int, country: Optional[str], admin1: Optional[str],
+                 feature_classes: Optional[str]) -> bool:
+        return ((country is None or self.country[row] == country)
+                and (admin1 is None or self.admin1[row] == admin1)
+                and (feature_classes is None or self.feature_class[row] in feature_classes))
+
+    def _rank(self, row: int) -> Tuple[int, int]:
+        return self.population[row], FEATURE_RANK.get(self.feature_class[row], 0)
+
+    def place(self, row: int) -> Place:
+        return Place(self.names[row], self.lat[row], self.lon[row], self.country[row], self.admin1[row],
+                     self.feature_class[row], self.feature_code[row], self.population[row])
+
+    def lookup(self, name: str, country: Optional[str] = None, admin1: Optional[str] = None,
+               feature_classes: Optional[str] = None) -> Optional[Place]:
+        """
+        Best place for `name`, optionally restricted to an ISO country code
+        ('US'), a first-level admin code ('CA') and GeoNames feature classes
+        ('AP' for admin areas and populated places). None if nothing matches.
+        """
+        self.stats['lookups'] += 1
+        memo_key = (name, country, admin1, feature_classes)
+        if memo_key in self._memo:
+            self.stats['memo_hits'] += 1
+            row = self._memo[memo_key]
+        else:
+            key = normalize_name(name)
+            row = None
+            for index in (self._primary, self._alternate):
+                rows = [r for r in self._candidates(index, key) if self._matches(r, country, admin1, feature_classes)]
+                if rows:
+                    row = max(rows, key=self._rank)
+                    break
+            self._memo[memo_key] = row
+        if row is None:
+            self.stats['misses'] += 1
+            self.misses[name] += 1
+            return None
+        return self.place(row)
+
+    def coords(self, name: str, **filters) -> Optional[Tuple[float, float]]:
+        place = self.lookup(name, **filters)
+        return (place.lat, place.lon) if place else None
+
+    def miss_report(self, limit: Optional[int] = 20) -> List[Tuple[str, int]]:
+        """Names that found no place, most frequent first (memoized repeats included)."""
+        return self.misses.most_common(limit)
+
+    def summary(self) -> Dict:
+        return dict(self.stats, places=len(self.names), distinct_misses=len(self.misses))
+
+    def __len__(self) -> int:
+        return len(self.names)
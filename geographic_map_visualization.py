@@ -1,150 +1,45 @@
-import json
+import argparse
 import folium
-from collections import defaultdict
+from branca.element import MacroElement
+from folium.plugins import FastMarkerCluster, HeatMap, MarkerCluster
+from jinja2 import Template
+from collections import Counter, defaultdict
 import random
+import json_codec
+from corpus import CORPUS_FILE, Corpus
+from geocoder import Geocoder
 
-# Enhanced coordinate lookup - Focused on US locations
-COORDS = {
-    # Major US States
-    'New York': [40.7128, -74.0060],
-    'New York City': [40.7128, -74.0060],
-    'California': [36.7783, -119.4179],
-    'Oregon': [44.0582, -121.3153],
-    'Indiana': [39.7684, -86.1581],
-    'Illinois': [40.6331, -89.3985],
-    'Texas': [31.9686, -99.9018],
-    'Washington': [47.6062, -122.3321],
-    'Connecticut': [41.6032, -73.0877],
-    'Michigan': [44.3148, -85.6024],
-    'Maine': [44.6939, -69.3819],
-    'Delaware': [39.3185, -75.5071],
-    'Kentucky': [37.6681, -84.6701],
-    'Massachusetts': [42.2304, -71.5301],
-    'Arkansas': [35.2010, -91.8318],
-    'Virginia': [37.4316, -78.6569],
-    'Florida': [27.6648, -81.5158],
-    'Ohio': [40.4173, -82.9071],
-    'Pennsylvania': [40.5908, -77.2098],
-    'Georgia': [32.1656, -82.9001],
-    'North Carolina': [35.7596, -79.0193],
-    'South Carolina': [33.8569, -80.9450],
-    'Tennessee': [35.7478, -86.6923],
-    'Alabama': [32.3182, -86.9023],
-    'Mississippi': [32.7416, -89.6787],
-    'Louisiana': [31.1695, -91.8678],
-    'Missouri': [38.4561, -92.2884],
-    'Iowa': [41.8780, -93.0977],
-    'Minnesota': [46.7296, -94.6859],
-    'Wisconsin': [43.7844, -88.7879],
-    'Kansas': [38.5111, -96.8005],
-    'Nebraska': [41.4925, -99.9018],
-    'South Dakota': [44.2998, -99.4388],
-    'North Dakota': [47.5515, -101.0020],
-    'Montana': [46.8797, -110.3626],
-    'Idaho': [44.0682, -114.7420],
-    'Wyoming': [42.7475, -107.2085],
-    'Colorado': [39.5501, -105.7821],
-    'Utah': [39.3209, -111.0937],
-    'Arizona': [33.7298, -111.4312],
-    'New Mexico': [34.5199, -105.8701],
-    'Nevada': [38.8026, -116.4194],
-    'Alaska': [64.2008, -149.4937],
-    'Hawaii': [19.8968, -155.5828],
-    
-    # Major US Cities
-    'San Francisco': [37.7749, -122.4194],
-    'Kirkland': [47.6815, -122.2087],
-    'Manhattan': [40.7831, -73.9712],
-    'Davis': [38.5449, -121.7405],
-    'New Haven': [41.3083, -72.9279],
-    'New Orleans': [29.9511, -90.0715],
-    'Washington DC': [38.9072, -77.0369],
-    'Washington, D.C.': [38.9072, -77.0369],
-    'Los Angeles': [34.0522, -118.2437],
-    'Chicago': [41.8781, -87.6298],
-    'Houston': [29.7604, -95.3698],
-    'Phoenix': [33.4484, -112.0740],
-    'Philadelphia': [39.9526, -75.1652],
-    'San Antonio': [29.4241, -98.4936],
-    'San Diego': [32.7157, -117.1611],
-    'Dallas': [32.7767, -96.7970],
-    'San Jose': [37.3382, -121.8863],
-    'Austin': [30.2672, -97.7431],
-    'Jacksonville': [30.3322, -81.6557],
-    'Fort Worth': [32.7555, -97.3308],
-    'Columbus': [39.9612, -82.9988],
-    'Charlotte': [35.2271, -80.8431],
-    'San Francisco Bay Area': [37.7749, -122.4194],
-    'The Bay Area': [37.7749, -122.4194],
-    'Northern California': [37.7749, -122.4194],
-    
-    # US Abbreviations and Variations
-    'Calif.': [36.7783, -119.4179],
-    'Conn.': [41.6032, -73.0877],
-    'Wash.': [47.6062, -122.3321],
-    'The United States': [37.0902, -95.7129],
-    'The United States Of America': [37.0902, -95.7129],
-    'Us': [37.0902, -95.7129],
-    'America': [37.0902, -95.7129],
-    'New York City\'S': [40.7128, -74.0060],
-    'New York City Region': [40.7128, -74.0060],
-    'Virginia County': [37.4316, -78.6569],
-    'The San Francisco Bay Area': [37.7749, -122.4194],
-    'History United': [37.0902, -95.7129],
-    'I.C.U': [37.0902, -95.7129],
-    'Atlantic': [29.9511, -90.0715],
-    
-    # Specific US Locations
-    'Jonesboro': [35.8423, -90.7043],
-    
-    # Keep some international locations for reference but they won't be shown on US-focused map
-    'Italy': [41.8719, 12.5674],
-    'China': [35.8617, 104.1954],
-    'France': [46.6034, 1.8883],
-    'Spain': [40.4637, -3.7492],
-    'Germany': [51.1657, 10.4515],
-    'Japan': [36.2048, 138.2529],
-    'South Korea': [35.9078, 127.7669],
-    'Hong Kong': [22.3193, 114.1694],
-    'Tokyo': [35.6762, 139.6503],
-    'Yokohama': [35.4437, 139.6380],
-    'Milan': [45.4642, 9.1900],
-    'Bergamo': [45.6983, 9.6773],
-    'Lombardy': [45.6983, 9.6773],
-    'Iran': [32.4279, 53.6880],
-    'Canada': [56.1304, -106.3468],
-    'Lebanon': [33.8547, 35.8623],
-    'Afghanistan': [33.9391, 67.7100],
-    'Iraq': [33.2232, 43.6793],
-    'Europe': [54.5260, 15.2551],
-    'Africa': [8.7832, 34.5085],
-    'Asia': [34.0479, 100.6197],
-    'West Africa': [8.7832, -11.2090],
-    'Ebola': [8.7832, -11.2090],
-    'Wuhan': [30.5928, 114.3055],
-    'Beijing': [39.9042, 116.4074],
-    'Nairobi': [-1.2921, 36.8219],
-    'Atalanta': [45.6983, 9.6773],
-    'Valencia': [39.4699, -0.3763],
-    'Champions League': [45.6983, 9.6773],
-}
+# Places are geocoded from the local gazetteer files (see geocoder.py)
+MAP_COUNTRY = 'US'  # Only places in this country are shown on the map
 
-# US location identifiers for filtering
-US_LOCATIONS = {
-    'New York', 'New York City', 'California', 'Oregon', 'Indiana', 'Illinois', 'Texas', 
-    'Washington', 'Connecticut', 'Michigan', 'Maine', 'Delaware', 'Kentucky', 'Massachusetts', 
-    'Arkansas', 'Virginia', 'Florida', 'Ohio', 'Pennsylvania', 'Georgia', 'North Carolina', 
-    'South Carolina', 'Tennessee', 'Alabama', 'Mississippi', 'Louisiana', 'Missouri', 'Iowa', 
-    'Minnesota', 'Wisconsin', 'Kansas', 'Nebraska', 'South Dakota', 'North Dakota', 'Montana', 
-    'Idaho', 'Wyoming', 'Colorado', 'Utah', 'Arizona', 'New Mexico', 'Nevada', 'Alaska', 'Hawaii',
-    'San Francisco', 'Kirkland', 'Manhattan', 'Davis', 'New Haven', 'New Orleans', 'Washington DC', 
-    'Washington, D.C.', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix', 'Philadelphia', 'San Antonio', 
-    'San Diego', 'Dallas', 'San Jose', 'Austin', 'Jacksonville', 'Fort Worth', 'Columbus', 'Charlotte',
-    'San Francisco Bay Area', 'The Bay Area', 'Northern California', 'Calif.', 'Conn.', 'Wash.',
-    'The United States', 'The United States Of America', 'Us', 'America', 'New York City\'S', 
-    'New York City Region', 'Virginia County', 'The San Francisco Bay Area', 'History United', 
-    'I.C.U', 'Atlantic', 'Jonesboro'
+# How articles are drawn:
+# - 'markers': one marker per location with an inline popup (fine for a few hundred articles)
+# - 'cluster': the same markers, grouped into clusters by zoom level
+# - 'fast': one point per article from a plain coordinate array, clustered in the
+#   browser (FastMarkerCluster); scales to 100k+ articles
+# - 'heatmap': article density only
+RENDER_MODE = 'markers'
+RENDER_MODES = ('markers', 'cluster', 'fast', 'heatmap')
+HEATMAP_LAYER = False  # Add a toggleable heatmap layer on top of the markers
+ARTICLE_OFFSET = 0.05  # Degrees of jitter between article points at the same place
+# Lazy popups: article details go to a JSON file next to map.html that the page
+# fetches on the first marker click, instead of being inlined in the HTML. Browsers
+# block fetch() from file:// pages, so serve the folder (python -m http.server).
+LAZY_POPUPS = False
+POPUP_DATA_FILE = 'map_popups.json'
+POPUP_PAGE_SIZE = 3  # Articles shown per popup page
+# Faceted layers: one toggleable layer per tone / framing / group value, counted
+# in the same pass that places the articles
+FACET_LAYERS = False
+ALL_LOCATIONS = False  # Place articles at every location they name, not just the first
+FACETS = {  # gpt_analysis field -> (layer label, circle color)
+    'tone': ('Tone', '#e74c3c'),
+    'framing': ('Framing', '#3498db'),
+    'group_mentions': ('Group', '#8e44ad'),
 }
+FACET_MAX_VALUES = 10  # Most common values per facet that get a layer
+# Record fields the map reads; article_text is never loaded
+MAP_FIELDS = ('headline', 'source', 'location', 'gpt_analysis')
 
 def extract_first_location(loc_list):
     """Extract the first location from a list of locations"""
@@ -183,84 +78,295 @@ def add_random_offset(lat, lon, max_offset=0.3):
     lon_offset = random.uniform(-max_offset, max_offset)
     return lat + lat_offset, lon + lon_offset
 
-def main():
-    # Read the JSONL file
-    articles = []
-    with open('covid_media_serp_results_with_locations.jsonl', 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                articles.append(json.loads(line.strip()))
-            except json.JSONDecodeError:
-                continue
-    
-    # Create map centered on the US
-    m = folium.Map(location=[39.8283, -98.5795], zoom_start=4, tiles='OpenStreetMap')
+def icon_color(count):
+    """Color code by article count"""
+    if count >= 10:
+        return 'red'
+    elif count >= 5:
+        return 'orange'
+    elif count >= 2:
+        return 'lightblue'
+    return 'green'
+
+def location_popup(location, location_articles):
+    # Create popup with all articles for this location
+    articles = location_articles[location]
+    popup_content = f"<h2 style='color: #2c3e50; margin-bottom: 15px;'>{location}</h2>"
+    popup_content += f"<p style='font-size: 16px; color: #7f8c8d; margin-bottom: 20px;'><strong>{len(articles)} articles</strong></p>"
     
-    # Track locations to avoid duplicates and count articles
-    location_counts = defaultdict(int)
-    location_articles = defaultdict(list)
+    # Show up to 3 articles in the popup
+    for i, article in enumerate(articles[:3]):
+        popup_content += create_popup_content(article)
+        if i < 2:  # Add separator between articles
+            popup_content += "<hr style='margin: 20px 0; border: 1px solid #ecf0f1;'>"
     
-    # Process each article - filter for US locations only
-    for article in articles:
-        locations = article.get('location', [])
-        if not locations:
-            continue
-            
-        first_loc = extract_first_location(locations)
-        if not first_loc or first_loc not in COORDS:
-            continue
-            
-        # Only include US locations
-        if first_loc not in US_LOCATIONS:
-            continue
-            
-        location_counts[first_loc] += 1
-        location_articles[first_loc].append(article)
-    
-    # Add markers for each location
+    if len(articles) > 3:
+        popup_content += f"<p style='text-align: center; color: #7f8c8d; font-style: italic; margin-top: 15px;'>... and {len(articles) - 3} more articles</p>"
+    return popup_content
+
+def add_location_markers(target, location_counts, location_articles, location_coords, location_ids=None):
+    """
+    One marker per location, added to the map or to a MarkerCluster. With
+    `location_ids` (lazy popups) markers get no inline popup; the (marker,
+    location id) pairs are returned so the page can wire up click loading.
+    """
+    lazy_markers = []
     for location, count in location_counts.items():
-        if location in COORDS:
-            lat, lon = COORDS[location]
+        if location in location_coords:
+            lat, lon = location_coords[location]
             
             # Add small random offset to prevent exact overlapping
             lat, lon = add_random_offset(lat, lon, 0.2)
             
-            # Create popup with all articles for this location
-            popup_content = f"<h2 style='color: #2c3e50; margin-bottom: 15px;'>{location}</h2>"
-            popup_content += f"<p style='font-size: 16px; color: #7f8c8d; margin-bottom: 20px;'><strong>{count} articles</strong></p>"
-            
-            # Show up to 3 articles in the popup
-            for i, article in enumerate(location_articles[location][:3]):
-                popup_content += create_popup_content(article)
-                if i < 2:  # Add separator between articles
-                    popup_content += "<hr style='margin: 20px 0; border: 1px solid #ecf0f1;'>"
-            
-            if len(location_articles[location]) > 3:
-                popup_content += f"<p style='text-align: center; color: #7f8c8d; font-style: italic; margin-top: 15px;'>... and {len(location_articles[location]) - 3} more articles</p>"
-            
-            # Color code by article count
-            if count >= 10:
-                icon_color = 'red'
-                icon = 'info-sign'
-            elif count >= 5:
-                icon_color = 'orange'
-                icon = 'info-sign'
-            elif count >= 2:
-                icon_color = 'lightblue'
-                icon = 'info-sign'
-            else:
-                icon_color = 'green'
-                icon = 'info-sign'
+            if location_ids is not None:
+                marker = folium.Marker(
+                    location=[lat, lon],
+                    icon=folium.Icon(color=icon_color(count), icon='info-sign'),
+                    tooltip=f"<b>{location}</b><br>{count} articles - Click for details!"
+                ).add_to(target)
+                lazy_markers.append((marker, location_ids[location]))
+                continue
             
             # Create marker with detailed popup
             folium.Marker(
                 location=[lat, lon],
-                popup=folium.Popup(popup_content, max_width=450),
-                icon=folium.Icon(color=icon_color, icon=icon),
+                popup=folium.Popup(location_popup(location, location_articles), max_width=450),
+                icon=folium.Icon(color=icon_color(count), icon='info-sign'),
                 tooltip=f"<b>{location}</b><br>{count} articles - Click for details!"
-            ).add_to(m)
+            ).add_to(target)
+    return lazy_markers
+
+def article_points(location_articles, location_coords, location_ids=None):
+    """
+    One [lat, lon, location] row per article, jittered so points at one place can
+    be told apart. With `location_ids` (lazy popups) each row also ends with its
+    location id.
+    """
+    points = []
+    for location, articles in location_articles.items():
+        lat, lon = location_coords[location]
+        extra = [location] if location_ids is None else [location, location_ids[location]]
+        for _ in articles:
+            points.append(list(add_random_offset(lat, lon, ARTICLE_OFFSET)) + extra)
+    return points
+
+def popup_record(article):
+    """The fields create_popup_content shows, as a compact list"""
+    analysis = article.get('gpt_analysis', {})
+    return [
+        article.get('headline', 'No headline'),
+        article.get('source', 'Unknown source'),
+        analysis.get('tone', 'Unknown'),
+        analysis.get('framing', 'Unknown'),
+        (analysis.get('group_mentions') or [])[:3],
+        (analysis.get('metaphors') or [])[:2],
+    ]
+
+def write_popup_data(path, location_articles):
+    """
+    Write every location's articles to the popup sidecar and return the
+    location -> id mapping. Location ids index the "locations" list.
+    """
+    location_ids = {}
+    locations = []
+    for location, articles in location_articles.items():
+        location_ids[location] = len(locations)
+        locations.append({"name": location, "articles": [popup_record(a) for a in articles]})
+    data = {
+        "fields": ["headline", "source", "tone", "framing", "group_mentions", "metaphors"],
+        "page_size": POPUP_PAGE_SIZE,
+        "locations": locations,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json_codec.dumps_compact(data))
+    return location_ids
+
+# Loads the popup sidecar on the first click and renders one page of a location's
+# articles at a time, in the same style as create_popup_content
+LAZY_POPUP_SCRIPT = """
+<script>
+var dhPopups = (function () {
+    var url = __POPUP_URL__, data = null, request = null, open = {};
+    function esc(value) {
+        return String(value).replace(/[&<>"']/g, function (c) {
+            return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+        });
+    }
+    function load() {
+        if (!request) {
+            request = fetch(url).then(function (r) { return r.json(); }).then(function (d) { data = d; });
+        }
+        return request;
+    }
+    function article(a) {
+        return '<div style="width: 400px; font-family: Arial, sans-serif;">'
+            + '<h3 style="margin: 0 0 15px 0; color: #2c3e50; font-size: 16px; border-bottom: 2px solid #3498db; padding-bottom: 5px;">' + esc(a[0]) + '</h3>'
+            + '<p style="margin: 8px 0; font-size: 14px;"><strong style="color: #34495e;">Source:</strong> ' + esc(a[1]) + '</p>'
+            + '<p style="margin: 8px 0; font-size: 14px;"><strong style="color: #34495e;">Tone:</strong> <span style="color: #e74c3c; font-weight: bold;">' + esc(a[2]) + '</span></p>'
+            + '<p style="margin: 8px 0; font-size: 14px;"><strong style="color: #34495e;">Framing:</strong> <span style="color: #3498db; font-weight: bold;">' + esc(a[3]) + '</span></p>'
+            + '<p style="margin: 8px 0; font-size: 14px;"><strong style="color: #34495e;">Groups:</strong> ' + (a[4].length ? esc(a[4].join(', ')) : 'None mentioned') + '</p>'
+            + '<p style="margin: 8px 0; font-size: 14px;"><strong style="color: #34495e;">Metaphors:</strong> ' + (a[5].length ? esc(a[5].join(', ')) : 'None') + '</p>'
+            + '</div>';
+    }
+    function render(id, page) {
+        var loc = data.locations[id], size = data.page_size;
+        var pages = Math.max(1, Math.ceil(loc.articles.length / size));
+        page = Math.min(Math.max(page, 0), pages - 1);
+        var html = "<h2 style='color: #2c3e50; margin-bottom: 15px;'>" + esc(loc.name) + "</h2>"
+            + "<p style='font-size: 16px; color: #7f8c8d; margin-bottom: 20px;'><strong>" + loc.articles.length + " articles</strong></p>";
+        html += loc.articles.slice(page * size, (page + 1) * size).map(article)
+            .join("<hr style='margin: 20px 0; border: 1px solid #ecf0f1;'>");
+        if (pages > 1) {
+            html += "<p style='text-align: center; margin-top: 15px;'>"
+                + (page > 0 ? "<a href='#' onclick='dhPopups.show(" + id + "," + (page - 1) + ");return false;'>&laquo; Previous</a> " : "")
+                + "<span style='color: #7f8c8d;'>Page " + (page + 1) + " of " + pages + "</span>"
+                + (page < pages - 1 ? " <a href='#' onclick='dhPopups.show(" + id + "," + (page + 1) + ");return false;'>Next &raquo;</a>" : "")
+                + "</p>";
+        }
+        return html;
+    }
+    function show(id, page) {
+        var marker = open[id];
+        load().then(function () { marker.setPopupContent(render(id, page)); }, function () {
+            marker.setPopupContent('Could not load ' + esc(url) + ' (serve this folder over HTTP)');
+        });
+    }
+    function attach(marker, id) {
+        marker.on('click', function () {
+            if (!marker.getPopup()) {
+                marker.bindPopup('Loading...', {maxWidth: 450}).openPopup();
+            }
+            open[id] = marker;
+            show(id, 0);
+        });
+    }
+    return {attach: attach, show: show};
+})();
+</script>
+"""
+
+class LazyPopupMarkers(MacroElement):
+    """Hooks the page's popup loader up to each location marker, after the markers are defined."""
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        {% for marker, location_id in this.markers %}
+        dhPopups.attach({{ marker.get_name() }}, {{ location_id }});
+        {% endfor %}
+        {% endmacro %}
+    """)
+
+    def __init__(self, markers):
+        super().__init__()
+        self._name = 'LazyPopupMarkers'
+        self.markers = markers
+
+# Called by FastMarkerCluster for each [lat, lon, location] row; keeps the page to one small
+# function instead of a marker object per article
+FAST_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindTooltip(row[2]);
+    if (row.length > 3) {
+        dhPopups.attach(marker, row[3]);
+    }
+    return marker;
+}
+"""
+
+class FacetLayer(folium.FeatureGroup):
+    """
+    Toggleable layer of count-sized circles, one per location, drawn from a
+    single [lat, lon, count, location] array rather than a marker object each.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.featureGroup();
+        {{ this.rows|tojson }}.forEach(function (row) {
+            L.circleMarker([row[0], row[1]], {
+                radius: 4 + 3 * Math.sqrt(row[2]), color: {{ this.color|tojson }},
+                fillOpacity: 0.5, weight: 1
+            }).bindTooltip('<b>' + row[3] + '</b><br>' + {{ this.label|tojson }} + ': ' + row[2] + ' articles')
+              .addTo({{ this.get_name() }});
+        });
+        {% endmacro %}
+    """)
+
+    def __init__(self, rows, label, color, **kwargs):
+        super().__init__(**kwargs)
+        self._name = 'FacetLayer'
+        self.rows = rows
+        self.label = label
+        self.color = color
+
+def facet_values(article, field):
+    """Normalized values of one gpt_analysis field; list fields give several"""
+    value = article.get('gpt_analysis', {}).get(field)
+    values = value if isinstance(value, list) else [value]
+    return {str(v).strip().lower() for v in values if v and str(v).strip()}
+
+def aggregate_articles(articles, geocoder, all_locations=ALL_LOCATIONS, facets=()):
+    """
+    Place every article in one pass. Returns the articles and coordinates per
+    location, for each facet field a {value: Counter(location -> articles)} and
+    a Counter(value -> distinct articles) so facet layers need no second pass,
+    and the number of articles placed. An article counts once per place even
+    if several of its location names resolve to it, and once per facet value
+    however many places it is shown at.
+    """
+    location_articles = defaultdict(list)
+    location_coords = {}
+    facet_counts = {field: defaultdict(Counter) for field in facets}
+    facet_totals = {field: Counter() for field in facets}
+    placed = 0
     
-    # Add legend
+    # Process each article - filter for US locations only
+    for article in articles:
+        locations = article.get('location', [])
+        if not locations:
+            continue
+        
+        if all_locations and isinstance(locations, list):
+            names = [loc.strip() for loc in locations if loc and loc.strip()]
+        else:
+            first_loc = extract_first_location(locations)
+            names = [first_loc] if first_loc else []
+        
+        places = {}
+        for name in names:
+            place = geocoder.lookup(name)
+            # Only include US locations
+            if place and place.country == MAP_COUNTRY:
+                # Spellings of the same place ("Calif.", "California") share one marker
+                places[place.name] = place
+        if not places:
+            continue
+        
+        placed += 1
+        values = {field: facet_values(article, field) for field in facets}
+        for field, field_values in values.items():
+            facet_totals[field].update(field_values)
+        for name, place in places.items():
+            location_articles[name].append(article)
+            location_coords[name] = (place.lat, place.lon)
+            for field, field_values in values.items():
+                for value in field_values:
+                    facet_counts[field][value][name] += 1
+    return location_articles, location_coords, facet_counts, facet_totals, placed
+
+def add_facet_layers(m, facet_counts, facet_totals, location_coords):
+    """
+    One hidden, toggleable layer per common facet value, with a circle per
+    location sized by its precomputed article count. Layers are ranked and
+    labelled by the value's distinct article count from facet_totals.
+    """
+    for field, by_value in facet_counts.items():
+        label, color = FACETS[field]
+        for value, total in facet_totals[field].most_common(FACET_MAX_VALUES):
+            rows = [[*location_coords[location], count, location]
+                    for location, count in by_value[value].most_common()]
+            FacetLayer(rows, f"{label} {value}", color, name=f"{label}: {value} ({total})", show=False).add_to(m)
+
+def add_legend(m):
     legend_html = '''
     <div style="position: fixed; 
                 bottom: 50px; left: 50px; width: 320px; height: auto; 
@@ -275,12 +381,80 @@ def main():
     </div>
     '''
     m.get_root().html.add_child(folium.Element(legend_html))
+
+def main(render_mode=RENDER_MODE, heatmap=HEATMAP_LAYER, lazy_popups=LAZY_POPUPS,
+         facet_layers=FACET_LAYERS, all_locations=ALL_LOCATIONS):
+    # Create map centered on the US
+    m = folium.Map(location=[39.8283, -98.5795], zoom_start=4, tiles='OpenStreetMap')
+    
+    # Track locations to avoid duplicates and count articles
+    geocoder = Geocoder()
+    with Corpus(CORPUS_FILE) as corpus:
+        location_articles, location_coords, facet_counts, facet_totals, placed = aggregate_articles(
+            corpus.iter_records(MAP_FIELDS), geocoder, all_locations=all_locations, facets=FACETS if facet_layers else ())
+    location_counts = {location: len(arts) for location, arts in location_articles.items()}
+    
+    location_ids = None
+    if lazy_popups and render_mode != 'heatmap':
+        location_ids = write_popup_data(POPUP_DATA_FILE, location_articles)
+        script = LAZY_POPUP_SCRIPT.replace('__POPUP_URL__', json_codec.dumps(POPUP_DATA_FILE))
+        m.get_root().header.add_child(folium.Element(script))
+    
+    lazy_markers = []
+    if render_mode == 'markers':
+        markers = folium.FeatureGroup(name='Articles by location').add_to(m)
+        lazy_markers = add_location_markers(markers, location_counts, location_articles, location_coords, location_ids)
+        add_legend(m)
+    elif render_mode == 'cluster':
+        cluster = MarkerCluster(name='Articles by location').add_to(m)
+        lazy_markers = add_location_markers(cluster, location_counts, location_articles, location_coords, location_ids)
+        add_legend(m)
+    if lazy_markers:
+        m.add_child(LazyPopupMarkers(lazy_markers))
+    
+    if render_mode in ('fast', 'heatmap') or heatmap:
+        points = article_points(location_articles, location_coords, location_ids)
+        if render_mode == 'fast':
+            FastMarkerCluster(points, callback=FAST_MARKER_CALLBACK, name='Articles').add_to(m)
+        if render_mode == 'heatmap' or heatmap:
+            HeatMap([point[:2] for point in points], name='Article density', radius=20,
+                    show=render_mode == 'heatmap').add_to(m)
+    
+    if facet_layers:
+        add_facet_layers(m, facet_counts, facet_totals, location_coords)
+    if heatmap or render_mode == 'heatmap' or facet_layers:
+        folium.LayerControl(collapsed=False).add_to(m)
     
     # Save the map
     m.save('map.html')
-    print(f"US-focused map created with {len(location_counts)} locations and {sum(location_counts.values())} articles!")
+    placements = sum(location_counts.values())
+    print(f"US-focused map ({render_mode}) created with {len(location_counts)} locations and {placed} articles"
+          f"{f' ({placements} placements)' if placements != placed else ''}!")
     print("Open map.html in your browser to view the interactive map.")
     print("Click on any marker to see detailed article analysis!")
+    if facet_layers:
+        layers = sum(min(len(by_value), FACET_MAX_VALUES) for by_value in facet_counts.values())
+        print(f"Added {layers} facet layers ({', '.join(label for label, _ in FACETS.values())}); toggle them in the layer control.")
+    if location_ids is not None:
+        print(f"Popup details written to {POPUP_DATA_FILE}; serve this folder over HTTP (python -m http.server) to load them.")
+    misses = geocoder.miss_report(10)
+    if misses:
+        print(f"{len(geocoder.misses)} location names not in the gazetteer, most common: "
+              + ', '.join(f"{name} ({count})" for name, count in misses))
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the US COVID-19 media coverage map (map.html)")
+    parser.add_argument('--mode', choices=RENDER_MODES, default=RENDER_MODE,
+                        help="markers: one popup marker per place; cluster: markers grouped by zoom; "
+                             "fast: clustered article points for large corpora; heatmap: density only")
+    parser.add_argument('--heatmap', action='store_true', default=HEATMAP_LAYER,
+                        help="also add a toggleable heatmap layer")
+    parser.add_argument('--lazy-popups', action='store_true', default=LAZY_POPUPS,
+                        help=f"load popup details from {POPUP_DATA_FILE} on click, paging through every article")
+    parser.add_argument('--facets', action='store_true', default=FACET_LAYERS,
+                        help="add toggleable layers per tone, framing and group mentioned")
+    parser.add_argument('--all-locations', action='store_true', default=ALL_LOCATIONS,
+                        help="place each article at every location it names instead of only the first")
+    args = parser.parse_args()
+    main(render_mode=args.mode, heatmap=args.heatmap, lazy_popups=args.lazy_popups,
+         facet_layers=args.facets, all_locations=args.all_locations)
@@ -0,0 +1,125 @@
+import re
+import codecs
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="text/html; charset=...">
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_.:-]+)', re.IGNORECASE)
+META_CHARSET_BYTES = 16 * 1024  # Charset declarations belong in the <head>
+
+class ConnectionStats:
+    """Per-host counts of requests sent and TCP/TLS connections opened."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.connections: Dict[str, int] = defaultdict(int)
+
+    def record_request(self, host: str) -> None:
+        with self._lock:
+            self.requests[host] += 1
+
+    def record_connection(self, host: str) -> None:
+        with self._lock:
+            self.connections[host] += 1
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            hosts = set(self.requests) | set(self.connections)
+            return {
+                host: {
+                    'requests': self.requests[host],
+                    'connections': self.connections[host],
+                    'reused': max(0, self.requests[host] - self.connections[host]),
+                }
+                for host in sorted(hosts)
+            }
+
+def _counting_pool(base, stats: ConnectionStats):
+    """Subclass a urllib3 pool class so every new connection it opens is counted."""
+    class CountingPool(base):
+        def _new_conn(self):
+            stats.record_connection(self.host)
+            return super()._new_conn()
+    CountingPool.__name__ = f"Counting{base.__name__}"
+    return CountingPool
+
+class PooledAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with keep-alive pools, a default timeout and connection reuse stats.
+
+    Only connection failures are retried here; 429/5xx retries are left to
+    rate_limiter.RateLimiter so they can honor Retry-After.
+    """
+
+    def __init__(self, stats: ConnectionStats, timeout: float = 30, **kwargs):
+        self.stats = stats
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool(HTTPConnectionPool, self.stats),
+            'https': _counting_pool(HTTPSConnectionPool, self.stats),
+        }
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        self.stats.record_request(requests.utils.urlparse(request.url).hostname or '')
+        return super().send(request, **kwargs)
+
+def build_session(pool_connections: int = 20, pool_maxsize: int = 32, timeout: float = 30,
+                  connect_retries: int = 2, user_agent: Optional[str] = None) -> requests.Session:
+    """
+    Build a requests.Session that keeps connections alive and reuses them.
+
+    pool_connections is the number of hosts whose pools are kept around,
+    pool_maxsize the number of idle connections kept per host; set it to at
+    least the number of threads that talk to the same host at once.
+    """
+    session = requests.Session()
+    session.connection_stats = ConnectionStats()
+    adapter = PooledAdapter(
+        session.connection_stats,
+        timeout=timeout,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        # Never retry or raise on a status (not even a 429 with Retry-After), so every
+        # response reaches the rate limiter's backoff
+        max_retries=Retry(total=connect_retries, connect=connect_retries, read=0, status=0,
+                          status_forcelist=None, respect_retry_after_header=False, raise_on_status=False),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if user_agent:
+        session.headers['User-Agent'] = user_agent
+    return session
+
+def response_text(resp: requests.Response) -> str:
+    """
+    The decoded body of a page. When the Content-Type header names no charset,
+    requests assumes ISO-8859-1 for text/*, which garbles UTF-8 pages ("café"
+    becomes "cafÃ©"); the page's own <meta charset> is used instead, falling
+    back to requests' detection (apparent_encoding).
+    """
+    if 'charset' not in resp.headers.get('Content-Type', '').lower():
+        match = META_CHARSET.search(resp.content[:META_CHARSET_BYTES])
+        encoding = match.group(1).decode('ascii') if match else None
+        if encoding:
+            try:
+                codecs.lookup(encoding)
+            except LookupError:
+                encoding = None
+        resp.encoding = encoding or resp.apparent_encoding
+    return resp.text
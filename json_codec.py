@@ -0,0 +1,54 @@
+import os
+import json
+from typing import IO, Any, Union
+
+try:
+    import orjson
+except ImportError:  # Optional: everything works on the stdlib json module
+    orjson = None
+
+# Decoder backend: 'orjson' when installed, else 'json'. Set JSON_BACKEND=json to force the stdlib.
+BACKEND = 'orjson' if orjson is not None and os.getenv('JSON_BACKEND', 'orjson') != 'json' else 'json'
+
+JSONDecodeError = json.JSONDecodeError  # orjson's decode error subclasses it
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    json.loads, through orjson when available. Input orjson rejects but the
+    stdlib accepts (NaN, Infinity) is handed to json.loads, and errors are
+    json.JSONDecodeError either way. One difference remains: orjson reads
+    integers beyond 64 bits as floats. Our records hold none (ids are strings),
+    and scanning every line for long digit runs cost more than orjson saves.
+    """
+    if BACKEND == 'orjson':
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+def load(f: IO) -> Any:
+    return loads(f.read())
+
+def dumps(obj: Any, **kwargs) -> str:
+    """
+    Always the stdlib encoder: JSONL lines, content hashes and exported files
+    must stay byte-identical (separators, ensure_ascii escaping, float repr),
+    which orjson doesn't reproduce.
+    """
+    return json.dumps(obj, **kwargs)
+
+def dumps_compact(obj: Any) -> str:
+    """
+    Compact JSON (no spaces, non-ASCII kept) for files only we or a browser
+    read back, such as index sidecars. Matches
+    json.dumps(obj, ensure_ascii=False, separators=(',', ':')) for strings,
+    integers, lists and dicts; with orjson, floats may be spelled differently
+    (1e16 for 1e+16) and NaN becomes null.
+    """
+    if BACKEND == 'orjson':
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:  # Types orjson doesn't serialize (e.g. integers beyond 64 bits)
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
@@ -0,0 +1,78 @@
+import json
+from typing import IO, Any, Iterable, Iterator
+
+import json_codec
+
+CHUNK_SIZE = 64 * 1024  # Characters read per refill when parsing
+
+def write_json_array(f: IO[str], items: Iterable[Any], indent: int = 2, ensure_ascii: bool = False) -> int:
+    """
+    Write `items` to `f` as a JSON array one element at a time, producing the
+    same text as json.dump(list(items), f, indent=indent, ensure_ascii=ensure_ascii)
+    without ever holding the list. Returns the number of items written.
+    """
+    prefix = ' ' * indent
+    count = 0
+    for item in items:
+        # Strings never contain raw newlines, so every newline is a line break to re-indent
+        text = json_codec.dumps(item, indent=indent, ensure_ascii=ensure_ascii).replace('\n', '\n' + prefix)
+        f.write(('[\n' if count == 0 else ',\n') + prefix + text)
+        count += 1
+    f.write('\n]' if count else '[]')
+    return count
+
+def iter_json_array(f: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Yield the elements of the JSON array in `f` one at a time. Only the element
+    being decoded (plus one chunk) is held in memory; consumed text is dropped
+    as soon as its element has been yielded.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def next_char() -> str:
+        """Skip whitespace and return the next character ('' at end of input) without consuming it."""
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buf) or not fill():
+                return buf[pos] if pos < len(buf) else ''
+
+    if next_char() != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    if next_char() == ']':
+        return
+    while True:
+        next_char()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # Unless a delimiter follows, the value (a number cut at "1.5e", say) may continue in the next chunk
+                if eof or (end < len(buf) and buf[end] in ' \t\r\n,]'):
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            if not fill():
+                item, end = decoder.raw_decode(buf, pos)
+                break
+        pos = end
+        yield item
+        separator = next_char()
+        pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Expected ',' or ']' in JSON array, got {separator!r}")
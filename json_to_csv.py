@@ -1,12 +1,9 @@
-import json
 import csv
 from datetime import datetime
 
-def convert_json_to_csv():
-    # Read the JSON file
-    with open('dh.json', 'r', encoding='utf-8') as json_file:
-        data = json.load(json_file)
-    
+from json_stream import iter_json_array
+
+def convert_json_to_csv(input_file='dh.json', output_file='dh.csv'):
     # Define the CSV headers (without article_text)
     headers = [
         'publish_date',
@@ -26,11 +23,13 @@ def convert_json_to_csv():
     ]
     
     # Create and write to CSV file
-    with open('dh.csv', 'w', newline='', encoding='utf-8') as csv_file:
+    # Articles are parsed one at a time from the JSON array, so memory stays flat
+    with open(input_file, 'r', encoding='utf-8') as json_file, \
+         open(output_file, 'w', newline='', encoding='utf-8') as csv_file:
         writer = csv.DictWriter(csv_file, fieldnames=headers)
         writer.writeheader()
         
-        for article in data:
+        for article in iter_json_array(json_file):
             # Create a row dictionary with the main fields (without article_text)
             row = {
                 'publish_date': article.get('publish_date', ''),
@@ -0,0 +1,96 @@
+from json_stream import iter_json_array
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: only this export and create_wordcloud's fast path need it
+    pa = pq = None
+
+# Columns whose few distinct values are stored once per file, with integer codes per row
+DICTIONARY_COLUMNS = ['source', 'tone', 'framing', 'grief_handling']
+# Kept as native list<string> columns instead of '; '-joined strings
+LIST_COLUMNS = ['location', 'group_mentions', 'metaphors', 'euphemisms', 'absences']
+STRING_COLUMNS = ['publish_date', 'headline', 'url', 'blame_or_agency', 'commodification_of_death']
+GPT_FIELDS = ['tone', 'framing', 'group_mentions', 'metaphors', 'euphemisms', 'absences',
+              'grief_handling', 'blame_or_agency', 'commodification_of_death']
+# Same column order as dh.csv
+COLUMNS = ['publish_date', 'source', 'headline', 'url', 'location'] + GPT_FIELDS
+ROW_GROUP_SIZE = 10_000  # Articles buffered per row group; memory stays flat whatever the corpus size
+
+def require_pyarrow():
+    if pa is None:
+        raise SystemExit("Parquet export needs pyarrow: pip install pyarrow")
+
+def analysis_schema():
+    """Schema of the analysis table (everything but article_text)."""
+    require_pyarrow()
+    fields = []
+    for column in COLUMNS:
+        if column in DICTIONARY_COLUMNS:
+            fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+        elif column in LIST_COLUMNS:
+            fields.append(pa.field(column, pa.list_(pa.string())))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+def as_list(value):
+    if value is None or value == '':
+        return []
+    return [str(v) for v in value] if isinstance(value, list) else [str(value)]
+
+def convert_json_to_parquet(input_file='dh.json', output_file='dh.parquet', text_file='dh_text.parquet'):
+    """
+    Write the articles in `input_file` as two Parquet files: `output_file` with
+    the metadata and GPT analysis (list fields as list columns, low-cardinality
+    fields dictionary-encoded), and `text_file` with just url and article_text,
+    so loading analysis columns never touches the article bodies.
+
+    Articles are streamed from the JSON array and written ROW_GROUP_SIZE at a
+    time, so only one row group is held in memory.
+    """
+    require_pyarrow()
+    schema = analysis_schema()
+    text_schema = pa.schema([pa.field('url', pa.string()), pa.field('article_text', pa.string())])
+    columns = {column: [] for column in COLUMNS}
+    urls, texts = [], []
+    count = 0
+
+    def write_row_group(writer, text_writer):
+        arrays = []
+        for field in schema:
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(columns[field.name], pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(columns[field.name], field.type))
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        text_writer.write_table(pa.Table.from_arrays([pa.array(urls, pa.string()), pa.array(texts, pa.string())],
+                                                     schema=text_schema))
+        for values in columns.values():
+            values.clear()
+        urls.clear()
+        texts.clear()
+
+    with open(input_file, 'r', encoding='utf-8') as json_file, \
+         pq.ParquetWriter(output_file, schema, compression='zstd', use_dictionary=DICTIONARY_COLUMNS) as writer, \
+         pq.ParquetWriter(text_file, text_schema, compression='zstd') as text_writer:
+        for article in iter_json_array(json_file):
+            gpt_analysis = article.get('gpt_analysis', {})
+            for column in COLUMNS:
+                value = gpt_analysis.get(column) if column in GPT_FIELDS else article.get(column)
+                if column in LIST_COLUMNS:
+                    columns[column].append(as_list(value))
+                else:
+                    columns[column].append('' if value is None else str(value))
+            urls.append(article.get('url', ''))
+            texts.append(article.get('article_text', ''))
+            count += 1
+            if len(urls) >= ROW_GROUP_SIZE:
+                write_row_group(writer, text_writer)
+        if urls or not count:
+            write_row_group(writer, text_writer)
+    return count
+
+if __name__ == '__main__':
+    count = convert_json_to_parquet()
+    print(f"Conversion completed. {count} articles saved to dh.parquet (article text in dh_text.parquet)")
@@ -0,0 +1,87 @@
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+def template_id(template: str) -> str:
+    """Short stable id for a prompt template, stored with each entry so stale ones can be purged."""
+    return hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]
+
+class LLMCache:
+    """
+    Persistent cache of parsed LLM responses, stored in SQLite.
+
+    Entries are keyed by a hash of the fully rendered prompt, the model and the
+    temperature, so an identical request is answered without a network round trip.
+    Each entry also records the id of the template the prompt was rendered from,
+    which lets entries be invalidated when the template changes. Safe to share
+    between threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, template TEXT NOT NULL, model TEXT NOT NULL, "
+            "response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt: str, model: str, temperature: float) -> str:
+        payload = json_codec.dumps([prompt, model, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, prompt: str, model: str, temperature: float) -> Optional[Dict]:
+        key = self.make_key(prompt, model, temperature)
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+        return json_codec.loads(row[0])
+
+    def put(self, prompt: str, model: str, temperature: float, response: Dict, template: str) -> None:
+        key = self.make_key(prompt, model, temperature)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, template, model, response, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, template, model, json_codec.dumps(response, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def invalidate_template(self, template: str) -> int:
+        """Delete every entry rendered from the given template id. Returns the number removed."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM responses WHERE template = ?", (template,))
+            self._conn.commit()
+        return cur.rowcount
+
+    def invalidate_stale(self, current_template: str) -> int:
+        """Delete every entry NOT rendered from the current template id. Returns the number removed."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM responses WHERE template != ?", (current_template,))
+            self._conn.commit()
+        if cur.rowcount:
+            logger.info(f"Removed {cur.rowcount} cached LLM responses from older prompt templates")
+        return cur.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return dict(self.stats, entries=count)
@@ -0,0 +1,161 @@
+"""
+Local stand-in for the OpenAI endpoints used by covid_media_serp_agent.py,
+so the batch-job flow (and plain chat calls) can be exercised offline.
+
+Implements:
+- POST /v1/files                  (multipart upload, purpose=batch)
+- GET  /v1/files/{id}/content
+- POST /v1/batches, GET /v1/batches/{id}
+- POST /v1/chat/completions
+
+Every analysis request gets a fixed, well-formed answer. Prompts with
+"Article id:" lines (batched analysis) get a JSON array with one object per id.
+
+Usage:
+    python mock_batch_server.py --port 8089
+    OPENAI_BASE_URL=http://127.0.0.1:8089 OPENAI_API_KEY=test python covid_media_serp_agent.py
+"""
+import re
+import json
+import time
+import uuid
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOCK_ANALYSIS = {
+    "tone": "neutral",
+    "framing": "other",
+    "group_mentions": [],
+    "metaphors": [],
+    "euphemisms": [],
+    "absences": [],
+    "grief_handling": "absent",
+    "blame_or_agency": "mock analysis",
+    "commodification_of_death": "mock analysis"
+}
+BATCH_DELAY_SECONDS = 1.0  # Time a mock batch spends "in_progress"
+
+files = {}
+batches = {}
+lock = threading.Lock()
+
+def mock_completion(body: dict) -> dict:
+    prompt = ''.join(m.get('content', '') for m in body.get('messages', []))
+    ids = re.findall(r'^Article id: (\S+)', prompt, flags=re.MULTILINE)
+    if ids:
+        content = json.dumps([dict(MOCK_ANALYSIS, id=i) for i in ids])
+    else:
+        content = json.dumps(MOCK_ANALYSIS)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "model": body.get('model', 'mock'),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+def run_batch(batch_id: str) -> None:
+    with lock:
+        batch = batches[batch_id]
+        batch['status'] = 'in_progress'
+        lines = files[batch['input_file_id']]['content'].decode('utf-8').splitlines()
+    time.sleep(BATCH_DELAY_SECONDS)
+    output, failed = [], 0
+    for line in lines:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if request.get('url') != batch['endpoint']:
+            failed += 1
+            response = {"status_code": 400, "body": {"error": {"message": "endpoint mismatch"}}}
+        else:
+            response = {"status_code": 200, "body": mock_completion(request.get('body', {}))}
+        output.append(json.dumps({"id": f"req-{uuid.uuid4().hex[:12]}", "custom_id": request.get('custom_id'),
+                                  "response": response, "error": None}))
+    output_id = f"file-{uuid.uuid4().hex[:12]}"
+    with lock:
+        files[output_id] = {"content": ("\n".join(output) + "\n").encode('utf-8'), "purpose": "batch_output"}
+        batch.update(status='completed', output_file_id=output_id, completed_at=int(time.time()),
+                     request_counts={"total": len(output), "completed": len(output) - failed, "failed": failed})
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_POST(self):
+        if self.path == '/v1/chat/completions':
+            return self._send_json(mock_completion(json.loads(self._body())))
+        if self.path == '/v1/files':
+            # Parse the multipart form with the email parser (cgi is deprecated)
+            raw = b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + self._body()
+            message = BytesParser(policy=HTTP).parsebytes(raw)
+            content = None
+            for part in message.iter_parts():
+                if part.get_param('name', header='content-disposition') == 'file':
+                    content = part.get_payload(decode=True)
+            if content is None:
+                return self._send_json({"error": {"message": "missing file"}}, status=400)
+            file_id = f"file-{uuid.uuid4().hex[:12]}"
+            with lock:
+                files[file_id] = {"content": content, "purpose": "batch"}
+            return self._send_json({"id": file_id, "object": "file", "bytes": len(content), "purpose": "batch"})
+        if self.path == '/v1/batches':
+            body = json.loads(self._body())
+            if body.get('input_file_id') not in files:
+                return self._send_json({"error": {"message": "unknown input_file_id"}}, status=400)
+            batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+            batch = {"id": batch_id, "object": "batch", "status": "validating", "endpoint": body.get('endpoint'),
+                     "input_file_id": body['input_file_id'], "completion_window": body.get('completion_window'),
+                     "created_at": int(time.time()), "output_file_id": None, "request_counts": {}}
+            with lock:
+                batches[batch_id] = batch
+            threading.Thread(target=run_batch, args=(batch_id,), daemon=True).start()
+            return self._send_json(batch)
+        self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def do_GET(self):
+        match = re.fullmatch(r'/v1/batches/([\w-]+)', self.path)
+        if match:
+            with lock:
+                batch = dict(batches.get(match.group(1)) or {})
+            return self._send_json(batch) if batch else self._send_json({"error": {"message": "not found"}}, 404)
+        match = re.fullmatch(r'/v1/files/([\w-]+)/content', self.path)
+        if match and match.group(1) in files:
+            data = files[match.group(1)]['content']
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/jsonl')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host: str = '127.0.0.1', port: int = 8089) -> ThreadingHTTPServer:
+    """Start the mock server on a background thread and return it (port 0 picks a free port)."""
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI batch/chat endpoints for offline runs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    print(f"Mock OpenAI server listening on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,92 @@
+import re
+import zlib
+import random
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+NUM_PERM = 64  # MinHash permutations per signature
+BANDS = 8  # LSH bands; NUM_PERM / BANDS rows each, giving a candidate threshold near 0.77
+SHINGLE_SIZE = 5  # Words per shingle
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed so signatures are comparable across runs and processes
+_rng = random.Random(1729)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """Hash the overlapping word n-grams of a lowercased text (punctuation ignored)."""
+    words = re.findall(r'\w+', (text or '').lower())
+    if len(words) < size:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))} if words else set()
+    return {zlib.crc32(' '.join(words[i:i + size]).encode('utf-8')) for i in range(len(words) - size + 1)}
+
+def minhash_signature(text: str) -> Tuple[int, ...]:
+    """
+    MinHash signature of a text's shingles. The fraction of positions where two
+    signatures agree estimates the Jaccard similarity of the two texts.
+    Module-level and pure, so it can run in a process pool.
+    """
+    hashes = shingles(text)
+    if not hashes:
+        return tuple([_MAX_HASH] * NUM_PERM)
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+def estimate_similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+class NearDuplicateIndex:
+    """
+    LSH index over MinHash signatures for finding near-duplicate articles.
+
+    Signatures are split into BANDS bands; texts sharing any whole band become
+    candidates, and a candidate counts as a duplicate when its estimated Jaccard
+    similarity reaches `threshold`. Safe to share between threads.
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self.rows = NUM_PERM // BANDS
+        self.signatures: Dict[str, Tuple[int, ...]] = {}
+        self.buckets: List[Dict[Tuple[int, ...], List[str]]] = [defaultdict(list) for _ in range(BANDS)]
+        self._lock = threading.RLock()  # find_or_add holds it across query + add
+
+    def _bands(self, sig: Tuple[int, ...]):
+        for band in range(BANDS):
+            yield band, sig[band * self.rows:(band + 1) * self.rows]
+
+    def query(self, sig: Tuple[int, ...]) -> Optional[str]:
+        """Return the key of the most similar indexed text at or above the threshold, if any."""
+        with self._lock:
+            candidates = set()
+            for band, chunk in self._bands(sig):
+                candidates.update(self.buckets[band].get(chunk, ()))
+            best_key, best_score = None, self.threshold
+            for key in candidates:
+                score = estimate_similarity(sig, self.signatures[key])
+                if score >= best_score:
+                    best_key, best_score = key, score
+            return best_key
+
+    def add(self, key: str, sig: Tuple[int, ...]) -> None:
+        with self._lock:
+            if key in self.signatures:
+                return
+            self.signatures[key] = sig
+            for band, chunk in self._bands(sig):
+                self.buckets[band][chunk].append(key)
+
+    def find_or_add(self, key: str, sig: Tuple[int, ...]) -> Optional[str]:
+        """Return the canonical key `sig` duplicates, or index it under `key` and return None."""
+        with self._lock:
+            canonical = self.query(sig)
+            if canonical is None:
+                self.add(key, sig)
+            return canonical
+
+    def __len__(self) -> int:
+        return len(self.signatures)
@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+FINAL_BATCH_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+def write_job_file(path: str, requests: Iterable[Tuple[str, Dict]], endpoint: str = '/v1/chat/completions') -> int:
+    """Write (custom_id, request body) pairs as a Batch API input file. Returns the number of lines."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for custom_id, body in requests:
+            line = {"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body}
+            f.write(json_codec.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+def parse_output_file(text: str) -> Dict[str, Optional[str]]:
+    """
+    Map each custom_id in a Batch API output file to the message content of its
+    response, or to None when that request failed.
+    """
+    contents = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json_codec.loads(line)
+        except json_codec.JSONDecodeError:
+            logger.warning(f"Skipping malformed batch output line: {line[:200]}")
+            continue
+        custom_id = entry.get('custom_id')
+        response = entry.get('response') or {}
+        try:
+            if response.get('status_code') != 200:
+                raise ValueError(f"status {response.get('status_code')}: {entry.get('error')}")
+            contents[custom_id] = response['body']['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.warning(f"Batch request {custom_id} failed: {e}")
+            contents[custom_id] = None
+    return contents
+
+class BatchClient:
+    """
+    Minimal client for the OpenAI Batch API (files + batches endpoints).
+
+    `request` is called as request(method, url, **kwargs) and must return a
+    requests.Response, e.g. rate_limiter.RateLimiter.request. Pointing base_url
+    at mock_batch_server.py runs the whole flow offline.
+    """
+
+    def __init__(self, base_url: str, api_key: str, request: Callable):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.request = request
+
+    def _call(self, method: str, path: str, **kwargs):
+        resp = self.request(method, self.base_url + path, headers=self.headers, timeout=300, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    def upload(self, path: str) -> str:
+        # Read up front so a retried upload resends the whole file
+        with open(path, 'rb') as f:
+            content = f.read()
+        resp = self._call('POST', '/v1/files', data={'purpose': 'batch'},
+                          files={'file': (os.path.basename(path), content, 'application/jsonl')})
+        return resp.json()['id']
+
+    def create(self, input_file_id: str, endpoint: str = '/v1/chat/completions', completion_window: str = '24h') -> Dict:
+        body = {"input_file_id": input_file_id, "endpoint": endpoint, "completion_window": completion_window}
+        return self._call('POST', '/v1/batches', json=body).json()
+
+    def get(self, batch_id: str) -> Dict:
+        return self._call('GET', f'/v1/batches/{batch_id}').json()
+
+    def download(self, file_id: str) -> str:
+        return self._call('GET', f'/v1/files/{file_id}/content').text
+
+    def wait(self, batch_id: str, poll_seconds: float = 30, timeout: Optional[float] = None) -> Dict:
+        """Poll a batch until it reaches a final status (or `timeout` seconds pass) and return it."""
+        started = time.monotonic()
+        while True:
+            batch = self.get(batch_id)
+            counts = batch.get('request_counts') or {}
+            logger.info(f"Batch {batch_id}: {batch.get('status')} "
+                        f"({counts.get('completed', 0)}/{counts.get('total', '?')} done, {counts.get('failed', 0)} failed)")
+            if batch.get('status') in FINAL_BATCH_STATUSES:
+                return batch
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"Batch {batch_id} still {batch.get('status')} after {timeout}s")
+            time.sleep(poll_seconds)
@@ -0,0 +1,128 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Part of every key. Bumped when what's stored changes meaning (2: pages without a
+# charset header are decoded by their <meta charset>); older entries are then never
+# read again and age out through the TTL and LRU eviction.
+CACHE_FORMAT = 2
+
+class PageCache:
+    """
+    Persistent on-disk cache of fetched HTML, keyed by URL.
+
+    Each page is stored in its own file named after the SHA-256 of its URL.
+    A file's mtime is the time the page was fetched (used for the TTL) and its
+    atime is the last time it was read (used for LRU eviction once the cache
+    grows past max_bytes). Eviction goes down to `evict_to` of max_bytes, so
+    the directory is scanned once per that much new data rather than on every
+    put; the scan runs outside the lock in one thread while others keep going.
+    Safe to share between threads.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float = 7 * 24 * 3600, max_bytes: int = 500 * 1024 * 1024,
+                 evict_to: float = 0.9):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.low_water = int(max_bytes * evict_to)
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._evicting = False
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory) if name.endswith('.html')
+        )
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(f"{CACHE_FORMAT}:{url}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + '.html')
+
+    def get(self, url: str) -> Optional[str]:
+        """Return the cached HTML for a URL, or None if it is missing or older than the TTL."""
+        path = self._path(url)
+        with self._lock:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                self.stats['misses'] += 1
+                return None
+            if time.time() - st.st_mtime > self.ttl_seconds:
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                self._remove(path, st.st_size)
+                return None
+            # Bump the access time for LRU while keeping the fetch time intact
+            os.utime(path, (time.time(), st.st_mtime))
+        # Read outside the lock; an eviction can remove the file meanwhile, which is just a miss
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                html = f.read()
+        except OSError as e:
+            logger.debug(f"Page cache entry for {url} went away before it was read: {e}")
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        return html
+
+    def put(self, url: str, html: str) -> None:
+        """Store the HTML for a URL, evicting least recently used pages if over the size cap."""
+        path = self._path(url)
+        data = html.encode('utf-8')
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            try:
+                old_size = os.path.getsize(path)
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            self._size += len(data) - old_size
+            evict = self._size > self.max_bytes and not self._evicting
+            if evict:
+                self._evicting = True
+        if evict:
+            try:
+                self._evict()
+            finally:
+                self._evicting = False
+
+    def _remove(self, path: str, size: int) -> None:
+        try:
+            os.remove(path)
+            self._size -= size
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        """Remove least recently read pages until the cache is down to low_water."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.html'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_atime, path, st.st_size))
+        entries.sort()
+        for _, path, size in entries:
+            with self._lock:
+                if self._size <= self.low_water:
+                    break
+                self._remove(path, size)
+                self.stats['evictions'] += 1
+        logger.debug(f"Page cache evicted down to {self._size} bytes")
+
+    def summary(self) -> Dict[str, int]:
+        return dict(self.stats, size_bytes=self._size)
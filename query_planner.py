@@ -0,0 +1,183 @@
+import os
+import json
+import queue
+import logging
+import threading
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+class Shard(NamedTuple):
+    shard_id: str
+    query: str
+
+def plan_shards(terms: str, sites: List[str], start_date: date, end_date: date, shard_days: int = 7) -> List[Shard]:
+    """
+    Split one long search into per-site, per-date-window shard queries.
+
+    Each window covers `shard_days` days inclusive. Google's after:/before: are
+    exclusive, so every query is widened by a day on each side; the resulting
+    overlap at window edges is removed by URL dedupe when shards are merged.
+    """
+    shards = []
+    for site in sites:
+        window_start = start_date
+        while window_start <= end_date:
+            window_end = min(end_date, window_start + timedelta(days=shard_days - 1))
+            after = window_start - timedelta(days=1)
+            before = window_end + timedelta(days=1)
+            query = f"{terms} site:{site} after:{after.isoformat()} before:{before.isoformat()}"
+            shards.append(Shard(f"{site}:{window_start.isoformat()}", query))
+            window_start = window_end + timedelta(days=1)
+    return shards
+
+class ShardProgress:
+    """
+    Per-shard progress persisted to a JSON file after every page.
+
+    For each shard id it records the status ('running', 'stopped', 'done' or
+    'failed'), the pagination offset to continue from, the number of results
+    fetched so far and the last error, so a shard can be resumed or retried alone.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.shards: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.shards = json.load(f)
+
+    def get(self, shard_id: str) -> Dict:
+        with self._lock:
+            return dict(self.shards.get(shard_id, {}))
+
+    def update(self, shard_id: str, **fields) -> None:
+        with self._lock:
+            self.shards.setdefault(shard_id, {}).update(fields)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.shards, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def reset(self, shard_id: str) -> None:
+        with self._lock:
+            self.shards.pop(shard_id, None)
+
+_SHARD_FINISHED = object()
+_PAGE_END = object()  # Queued after a page's results: (_PAGE_END, shard id, next start, results, last page)
+
+def run_shards(shards: Iterable[Shard], fetch_page: Callable[[str, int], List[Dict]], page_size: int,
+               max_results: int, progress: ShardProgress, concurrency: int = 4,
+               only: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+    """
+    Run shard queries in parallel and yield their merged, URL-deduplicated results.
+
+    `fetch_page(query, start)` returns one page of results. Shards already marked
+    'done' in `progress` are skipped, and interrupted ones continue from their last
+    offset. Progress recorded for a different query under the same id (search
+    terms or SHARD_DAYS changed) is discarded, so that shard starts over. Pass
+    `only` to (re)run just the given shard ids from scratch.
+    Stops every shard once `max_results` unique results have been yielded.
+
+    A shard's offset only moves past a page once the consumer has taken every
+    result of it, and the shard is marked 'done' after its last result has been
+    yielded, so results still queued when the consumer stops are fetched again
+    on the next run instead of being lost.
+    """
+    only = set(only) if only else None
+    selected = []
+    for shard in shards:
+        stored_query = progress.get(shard.shard_id).get('query')
+        if stored_query is not None and stored_query != shard.query:
+            logger.info(f"Search shard {shard.shard_id} now runs a different query; discarding its progress")
+            progress.reset(shard.shard_id)
+        if only is not None:
+            if shard.shard_id not in only:
+                continue
+            progress.reset(shard.shard_id)
+        elif progress.get(shard.shard_id).get('status') == 'done':
+            logger.debug(f"Skipping completed shard {shard.shard_id}")
+            continue
+        selected.append(shard)
+    logger.info(f"Running {len(selected)} search shards with {concurrency} in parallel")
+    if not selected:
+        return
+
+    results: queue.Queue = queue.Queue(maxsize=page_size * concurrency)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Don't block forever on a full queue once the consumer has stopped reading
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run_shard(shard: Shard) -> None:
+        state = progress.get(shard.shard_id)
+        start = state.get('next_start', 0)
+        fetched = state.get('results', 0)
+        progress.update(shard.shard_id, status='running', query=shard.query)
+        try:
+            while not stop.is_set():
+                page = fetch_page(shard.query, start)
+                for res in page:
+                    if not put(dict(res, shard=shard.shard_id)):
+                        return
+                start += page_size
+                fetched += len(page)
+                # The consumer records the new offset once it has taken the whole page
+                last_page = len(page) < page_size
+                if not put((_PAGE_END, shard.shard_id, start, fetched, last_page)) or last_page:
+                    return
+        except Exception as e:
+            logger.warning(f"Search shard {shard.shard_id} failed: {e}")
+            progress.update(shard.shard_id, status='failed', error=str(e))
+        finally:
+            results.put(_SHARD_FINISHED)
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    for shard in selected:
+        executor.submit(run_shard, shard)
+
+    seen = set()
+    finished = 0
+    try:
+        while finished < len(selected):
+            item = results.get()
+            if item is _SHARD_FINISHED:
+                finished += 1
+                continue
+            if isinstance(item, tuple):
+                _, shard_id, next_start, fetched, last_page = item
+                if last_page:
+                    progress.update(shard_id, next_start=next_start, results=fetched, status='done', error=None)
+                else:
+                    progress.update(shard_id, next_start=next_start, results=fetched)
+                continue
+            url = item.get('url')
+            if not url or url in seen or len(seen) >= max_results:
+                continue
+            seen.add(url)
+            yield item
+            if len(seen) >= max_results:
+                logger.info(f"Search budget of {max_results} results reached; stopping shards")
+                break
+    finally:
+        stop.set()
+        # Drain so blocked shard threads can finish; whatever is discarded here
+        # wasn't consumed, so its pages stay unrecorded and are refetched next run
+        while finished < len(selected):
+            if results.get() is _SHARD_FINISHED:
+                finished += 1
+        executor.shutdown(wait=True)
+        for shard in selected:
+            if progress.get(shard.shard_id).get('status') == 'running':
+                progress.update(shard.shard_id, status='stopped')
+    logger.info(f"Search shards yielded {len(seen)} unique results")
@@ -0,0 +1,149 @@
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds to wait."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class HostLimiter:
+    """
+    Adaptive token bucket for a single host.
+
+    The refill rate grows additively after every successful request, up to
+    max_rate, and is halved whenever the host pushes back with a 429 or 5xx
+    (AIMD), so throughput settles just below what the host will accept.
+    A Retry-After from the host pauses all requests to it until it expires.
+    """
+
+    def __init__(self, host: str, initial_rate: float, max_rate: float, min_rate: float = 0.1):
+        self.host = host
+        self.rate = initial_rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase = max_rate / 50  # ~50 clean requests to climb from zero to max_rate
+        self.tokens = 1.0
+        self.last = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request to this host is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                # Cap the bucket at one second's worth of requests so bursts stay small
+                self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            logger.debug(f"Throttled by {self.host}: rate now {self.rate:.2f} req/s")
+
+class RateLimiter:
+    """
+    Per-host rate limiting plus retries for outbound HTTP requests.
+
+    Requests are retried on connection errors, timeouts, 429 and 5xx responses,
+    waiting for the host's Retry-After when it sends one and for a jittered
+    exponential backoff otherwise. Other responses are returned as-is so callers
+    keep using raise_for_status(). Requests go through `session` when one is
+    given (see http_session.build_session), else through module-level requests.
+    """
+
+    def __init__(self, host_rates: Dict[str, Tuple[float, float]], default_rate: Tuple[float, float] = (2.0, 10.0),
+                 max_retries: int = 5, base_backoff: float = 1.0, max_backoff: float = 60.0, session=None):
+        self.host_rates = host_rates
+        self.session = session
+        self.default_rate = default_rate
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0}
+        self._hosts: Dict[str, HostLimiter] = {}
+        self._lock = threading.Lock()
+
+    def for_host(self, host: str) -> HostLimiter:
+        with self._lock:
+            if host not in self._hosts:
+                initial_rate, max_rate = self.host_rates.get(host, self.default_rate)
+                self._hosts[host] = HostLimiter(host, initial_rate, max_rate)
+            return self._hosts[host]
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries out so concurrent workers don't retry in lockstep
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def request(self, method: str, url: str, session=None, **kwargs) -> requests.Response:
+        """Send a request through the host's limiter, retrying transient failures."""
+        session = session or self.session or requests
+        limiter = self.for_host(urlparse(url).hostname or '')
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            self._count('requests')
+            try:
+                resp = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.RetryError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logger.debug(f"{method} {url} failed ({e}); retrying in {delay:.1f}s")
+                self._count('retries')
+                time.sleep(delay)
+                continue
+            if resp.status_code not in RETRY_STATUS_CODES:
+                limiter.on_success()
+                return resp
+            retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+            limiter.on_throttle(retry_after)
+            self._count('throttled')
+            if attempt == self.max_retries:
+                return resp
+            delay = retry_after if retry_after is not None else self.backoff(attempt)
+            logger.debug(f"{method} {url} returned {resp.status_code}; retrying in {delay:.1f}s")
+            self._count('retries')
+            time.sleep(min(delay, self.max_backoff))
+        return resp
+
+    def summary(self) -> Dict[str, object]:
+        with self._lock:
+            rates = {host: round(limiter.rate, 2) for host, limiter in self._hosts.items()}
+        return dict(self.stats, rates=rates)
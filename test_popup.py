@@ -1,4 +1,4 @@
-import json
+from corpus import CORPUS_FILE, Corpus
 
 def create_popup_content(article):
     """Create rich popup content for each article"""
@@ -26,15 +26,8 @@ def create_popup_content(article):
     return popup_html
 
 # Read a few articles and test popup content
-articles = []
-with open('covid_media_serp_results_with_locations.jsonl', 'r', encoding='utf-8') as f:
-    for i, line in enumerate(f):
-        if i >= 5:  # Just read first 5 articles
-            break
-        try:
-            articles.append(json.loads(line.strip()))
-        except json.JSONDecodeError:
-            continue
+with Corpus(CORPUS_FILE) as corpus:
+    articles = corpus.head(5, ['headline', 'source', 'gpt_analysis'])  # Just read first 5 articles
 
 print("Testing popup content for first 5 articles:")
 print("=" * 50)